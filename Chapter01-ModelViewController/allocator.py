@@ -0,0 +1,101 @@
+import fcntl
+import os
+import string
+import threading
+
+BASE26 = string.ascii_lowercase
+BASE62 = string.ascii_lowercase + string.ascii_uppercase + string.digits
+
+
+def encode(number, alphabet=BASE26):
+    """Encodes positive number to a string in bijective numeration, that is:
+    1 -> a
+    26 -> z
+    27 -> aa
+    53 -> ba
+    """
+    base = len(alphabet)
+    chars = []
+    while number > 0:
+        number, remainder = divmod(number - 1, base)
+        chars.append(alphabet[remainder])
+    return ''.join(reversed(chars))
+
+
+def decode(string, alphabet=BASE26):
+    """Decodes string created by encode back to a number."""
+    base = len(alphabet)
+    number = 0
+    for char in string:
+        number = number * base + alphabet.index(char) + 1
+    return number
+
+
+class BlockAllocator():
+    """Hands out unique ids across threads and processes.
+
+    Ids are reserved from a counter file in blocks of block_size, so the file
+    is locked and rewritten once per block rather than once per id. Every
+    process takes its own blocks, so ids are unique but not ordered between
+    processes, and ids left in a block when a process exits are never used.
+    """
+
+    def __init__(self, filename, block_size=100, initial=0):
+        """initial is the last used id when the counter file does not exist."""
+        self.filename = filename
+        self.block_size = block_size
+        self.initial = initial
+        self._ids = iter(())
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        """Returns a new unique id."""
+        # Taking the next id of a range iterator is atomic, so the lock is
+        # only needed to reserve a new block.
+        try:
+            return next(self._ids)
+        except StopIteration:
+            pass
+
+        with self._lock:
+            try:
+                return next(self._ids)
+            except StopIteration:
+                self._ids = iter(self._reserve(self.block_size))
+                return next(self._ids)
+
+    def allocate_many(self, count):
+        """Returns range of count new unique ids, reserved in one block."""
+        if count <= 0:
+            return range(0)
+        return self._reserve(count)
+
+    def advance_to(self, last):
+        """Makes sure ids up to last are never handed out."""
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            content = os.read(fd, 64)
+            current = int(content) if content.strip() else self.initial
+            if current < last:
+                self._write_counter(fd, last)
+        finally:
+            os.close(fd)
+
+    def _reserve(self, count):
+        """Advances the shared counter by count and returns reserved ids."""
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            content = os.read(fd, 64)
+            last = int(content) if content.strip() else self.initial
+            self._write_counter(fd, last + count)
+        finally:
+            os.close(fd)
+        return range(last + 1, last + count + 1)
+
+    @staticmethod
+    def _write_counter(fd, value):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(value).encode('ascii'))
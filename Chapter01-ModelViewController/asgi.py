@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# An asyncio (ASGI) entry point serving the same routes as controller.py.
+#
+# Run it with any ASGI server, for example: uvicorn asgi:app
+#
+# Storage calls block on file I/O, so they run in a thread pool and never
+# stall the event loop. Templates are compiled once on import. The main page
+# does not depend on the request, so it is rendered once too.
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from jinja2 import Environment, FileSystemLoader
+
+import models
+from lrucache import LRUCache
+
+REDIRECT_CACHE_SIZE = 1024
+STORAGE_THREADS = 16
+
+VIEWS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'views')
+
+templates = Environment(loader=FileSystemLoader(VIEWS_DIR), autoescape=True)
+main_page = templates.get_template('main_page.html').render().encode('utf-8')
+success_template = templates.get_template('success.html')
+
+storage_executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS)
+
+redirect_cache = LRUCache(REDIRECT_CACHE_SIZE)
+models.Url.register_observer(redirect_cache)
+
+
+async def run_in_storage_thread(function, *args):
+    """Runs blocking storage call in the thread pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_executor, function, *args)
+
+
+async def index(scope):
+    """Renders main page."""
+    return 200, [], main_page
+
+
+async def shorten(scope):
+    """Returns short_url of requested full_url."""
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    full_url = query.get('url', [''])[0]
+    if not full_url:
+        return 400, [], b'Bad Request'
+
+    url_model = await run_in_storage_thread(models.Url.shorten, full_url)
+    short_url = get_host(scope) + '/' + url_model.short_url
+    body = success_template.render(short_url=short_url).encode('utf-8')
+    return 200, [], body
+
+
+async def redirect_to_full(scope):
+    """Gets short url and redirects user to corresponding full url if found."""
+    path = scope['path'][1:]
+    full_url = redirect_cache.get(path)
+    if full_url is None:
+        url_model = await run_in_storage_thread(models.Url.get_by_short_url,
+                                                path)
+        if not url_model:
+            return 404, [], b'Not Found'
+
+        full_url = url_model.full_url
+        redirect_cache.put(path, full_url)
+
+    return 302, [(b'location', full_url.encode('utf-8'))], b''
+
+
+def get_host(scope):
+    """Returns value of Host header like Flask request.host does."""
+    for name, value in scope['headers']:
+        if name == b'host':
+            return value.decode('latin-1')
+    return ''
+
+
+def route(path):
+    """Returns handler of path."""
+    if path == '/':
+        return index
+    if path in ('/shorten', '/shorten/'):
+        return shorten
+    return redirect_to_full
+
+
+async def app(scope, receive, send):
+    """ASGI application."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                storage_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    status, headers, body = await route(scope['path'])(scope)
+    headers = headers + [(b'content-type', b'text/html; charset=utf-8'),
+                         (b'content-length', str(len(body)).encode('ascii'))]
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Measures throughput and latency of the url shortener.
+#
+# For every storage backend and dataset size, a fresh storage is filled with
+# that many mappings, then shorten and redirect are timed both directly on
+# models.Url and through the Flask test client. Example:
+#
+#   ./benchmark.py --sizes 1000 100000 --operations 2000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import models
+from allocator import BlockAllocator
+from storage import LogStorage, ShardedStorage, SQLiteStorage
+
+BACKENDS = {
+    'log': lambda directory: LogStorage(os.path.join(directory, 'urls.log')),
+    'sqlite': lambda directory: SQLiteStorage(os.path.join(directory,
+                                                           'urls.db')),
+    'sharded': lambda directory: ShardedStorage.from_files(
+        LogStorage, os.path.join(directory, 'urls.{}.log'), 8),
+}
+
+FILL_BATCH_SIZE = 10000
+
+
+def percentile(sorted_values, percent):
+    """Returns percentile of already sorted values."""
+    index = int(round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def measure(function, arguments):
+    """Calls function with every argument, returns per call latencies."""
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(backend, size, name, latencies):
+    latencies.sort()
+    print('{:<7} {:>9} {:<18} {:>10.0f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+        backend, size, name, len(latencies) / sum(latencies),
+        percentile(latencies, 50) * 1e6, percentile(latencies, 95) * 1e6,
+        percentile(latencies, 99) * 1e6))
+
+
+def fill(size):
+    """Saves size mappings, returns their short urls."""
+    short_urls = []
+    for start in range(0, size, FILL_BATCH_SIZE):
+        full_urls = ['http://example.com/{}'.format(i)
+                     for i in range(start, min(start + FILL_BATCH_SIZE, size))]
+        short_urls.extend(url_model.short_url
+                          for url_model in models.Url.shorten_many(full_urls))
+    return short_urls
+
+
+def run(backend, size, operations, client):
+    with tempfile.TemporaryDirectory() as directory:
+        models.Url.storage = BACKENDS[backend](directory)
+        models.Url.allocator = BlockAllocator(os.path.join(directory,
+                                                           'last_id'))
+        short_urls = fill(size)
+        lookups = [random.choice(short_urls) for _ in range(operations)]
+        new_urls = ['http://example.org/{}'.format(i)
+                    for i in range(operations)]
+
+        report(backend, size, 'model shorten',
+               measure(models.Url.shorten, new_urls))
+        report(backend, size, 'model redirect',
+               measure(models.Url.get_by_short_url, lookups))
+
+        if client:
+            new_urls = ['http://example.net/{}'.format(i)
+                        for i in range(operations)]
+            report(backend, size, 'http shorten', measure(
+                lambda url: client.get('/shorten/', query_string={'url': url}),
+                new_urls))
+            controller.redirect_cache.clear()
+            report(backend, size, 'http redirect',
+                   measure(lambda short_url: client.get('/' + short_url),
+                           lookups))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1000, 10000, 100000, 1000000])
+    arg_parser.add_argument('--operations', type=int, default=1000)
+    arg_parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS),
+                            choices=sorted(BACKENDS))
+    arg_parser.add_argument('--no-http', action='store_true',
+                            help="measure models only")
+    args = arg_parser.parse_args()
+
+    client = None
+    if not args.no_http:
+        import controller
+        client = controller.app.test_client()
+
+    print('{:<7} {:>9} {:<18} {:>10} {:>9} {:>9} {:>9}'.format(
+        'backend', 'size', 'operation', 'ops/s', 'p50 us', 'p95 us',
+        'p99 us'))
+    for backend in args.backends:
+        for size in args.sizes:
+            run(backend, size, args.operations, client)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Rewrites url mappings into the storage of models.Url, deduplicating full
+# urls on the way.
+#
+# The source is either a legacy short_to_url.p pickle or a LogStorage log.
+# By default duplicate short urls are kept as aliases, so links handed out
+# before keep working, while the reverse index points to the first one.
+import argparse
+import pickle
+
+import models
+from allocator import decode
+from storage import LogStorage
+
+BATCH_SIZE = 10000
+
+
+def load_legacy_mapping(filename):
+    """Yields (short_url, full_url) pairs from a short_to_url.p pickle."""
+    with open(filename, 'rb') as file_:
+        short_to_url = pickle.load(file_)
+    for short_url, url in short_to_url.items():
+        yield short_url, url.full_url
+
+
+def compact(pairs, storage, keep_aliases=True, batch_size=BATCH_SIZE):
+    """Saves pairs to storage in batches of batch_size, returns counts of
+    saved and dropped pairs."""
+    count = saved = 0
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) == batch_size:
+            saved += save_batch(batch, storage, keep_aliases)
+            count += len(batch)
+            batch = []
+    saved += save_batch(batch, storage, keep_aliases)
+    count += len(batch)
+    return saved, count - saved
+
+
+def save_batch(batch, storage, keep_aliases=True):
+    """Saves batch of pairs with one write, returns count of saved ones."""
+    if keep_aliases:
+        storage.put_many(batch)
+        return len(batch)
+    new_pairs = []
+    new_full_urls = set()
+    for short_url, full_url in batch:
+        if full_url in new_full_urls or \
+                storage.get_short_url(full_url) is not None:
+            continue
+        new_full_urls.add(full_url)
+        new_pairs.append((short_url, full_url))
+    storage.put_many(new_pairs)
+    return len(new_pairs)
+
+
+def last_id(short_urls, alphabet):
+    """Returns the biggest id among short_urls made of alphabet."""
+    ids = [0]
+    for short_url in short_urls:
+        try:
+            ids.append(decode(short_url, alphabet))
+        except ValueError:
+            pass
+    return max(ids)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('source', help="short_to_url.p or a log file")
+    arg_parser.add_argument('--drop-aliases', action='store_true',
+                            help="save only the first short url of full url")
+    args = arg_parser.parse_args()
+
+    if args.source.endswith('.p'):
+        pairs = list(load_legacy_mapping(args.source))
+    else:
+        pairs = list(LogStorage(args.source).items())
+
+    saved, dropped = compact(pairs, models.Url.storage,
+                             keep_aliases=not args.drop_aliases)
+    # New short urls must not collide with the imported ones.
+    models.Url.allocator.advance_to(
+        last_id((short_url for short_url, _ in pairs), models.Url.alphabet))
+    if isinstance(models.Url.storage, LogStorage):
+        models.Url.storage.checkpoint()
+
+    print("Saved {} mappings, dropped {} duplicates".format(saved, dropped))
@@ -3,13 +3,63 @@
 # Request is used to encapsulate HTTP request. It will contain request methods,
 # request arguments and other related information.
 
-from flask import redirect, render_template, request, Flask
+import time
+
+from flask import (g, jsonify, redirect, render_template, request, Flask,
+                   Response)
 from werkzeug.exceptions import BadRequest, NotFound
 
 import models
+from lrucache import LRUCache
+from metrics import registry
 
 # Initialize Flask application
 app = Flask(__name__, template_folder='views')
+app.config.setdefault('REDIRECT_CACHE_SIZE', 1024)
+app.config.setdefault('METRICS_ENABLED', False)
+app.config.from_envvar('SHORTENER_SETTINGS', silent=True)
+
+# While disabled, metrics calls return right away and /metrics is not found.
+registry.enabled = app.config['METRICS_ENABLED']
+
+# Hot short urls are redirected from memory without touching the storage.
+# The cache drops a short url every time the model saves it.
+redirect_cache = LRUCache(app.config['REDIRECT_CACHE_SIZE'])
+models.Url.register_observer(redirect_cache)
+
+
+@app.before_request
+def start_timer():
+    if registry.enabled:
+        g.start_time = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    if registry.enabled and 'start_time' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry.observe('shortener_request_seconds',
+                         time.perf_counter() - g.start_time, route=route)
+        registry.inc('shortener_requests_total', route=route,
+                     status=response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Returns metrics in the Prometheus text format."""
+    if not registry.enabled:
+        raise NotFound()
+
+    for name in ('hits', 'misses', 'evictions'):
+        registry.set('shortener_redirect_cache_{}_total'.format(name),
+                     getattr(redirect_cache, name), kind='counter')
+    lookups = redirect_cache.hits + redirect_cache.misses
+    registry.set('shortener_redirect_cache_hit_ratio',
+                 redirect_cache.hits / lookups if lookups else 0)
+    registry.set('shortener_redirect_cache_size', len(redirect_cache))
+    return Response(registry.expose(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/')
@@ -35,17 +85,60 @@ def shorten():
     return render_template('success.html', short_url=short_url)
 
 
+def _get_json_strings():
+    """Returns JSON array of non-empty strings posted in request body."""
+    strings = request.get_json(force=True, silent=True)
+    if not isinstance(strings, list) or not all(
+            isinstance(string, str) and string for string in strings):
+        raise BadRequest()
+    return strings
+
+
+@app.route('/shorten/batch', methods=['POST'])
+def shorten_batch():
+    """Returns list of short_urls of full_urls posted as a JSON array."""
+    full_urls = _get_json_strings()
+
+    url_models = models.Url.shorten_many(full_urls)
+    return jsonify([request.host + '/' + url_model.short_url
+                    for url_model in url_models])
+
+
+@app.route('/resolve/batch', methods=['POST'])
+def resolve_batch():
+    """Returns list of full_urls of short_urls posted as a JSON array, null
+    for unknown short_urls."""
+    short_urls = _get_json_strings()
+
+    full_urls = [redirect_cache.get(short_url) for short_url in short_urls]
+    missing = [short_url for short_url, full_url in zip(short_urls, full_urls)
+               if full_url is None]
+    found = {}
+    for url_model in models.Url.get_many_by_short_url(missing):
+        if url_model:
+            found[url_model.short_url] = url_model.full_url
+            redirect_cache.put(url_model.short_url, url_model.full_url)
+
+    return jsonify([full_url or found.get(short_url)
+                    for short_url, full_url in zip(short_urls, full_urls)])
+
+
 @app.route('/<path:path>')
 def redirect_to_full(path=''):
     """Gets short url and redirects user to corresponding full url if found."""
-    # Model returns object with full_url property.
-    url_model = models.Url.get_by_short_url(path)
+    full_url = redirect_cache.get(path)
+    if full_url is None:
+        # Model returns object with full_url property.
+        url_model = models.Url.get_by_short_url(path)
 
-    # Validate model return.
-    if not url_model:
-        raise NotFound()
+        # Validate model return.
+        if not url_model:
+            raise NotFound()
+
+        full_url = url_model.full_url
+        redirect_cache.put(path, full_url)
 
-    return redirect(url_model.full_url)
+    return redirect(full_url)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+import bisect
+import threading
+import time
+
+# Upper bounds of latency histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram():
+    """Counts observed values in buckets like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last count is for values above the biggest bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Timer():
+    """A context manager that observes its run time in a histogram."""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start,
+                              **self.labels)
+
+
+class NullTimer():
+    """A Timer doing nothing, used while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Registry():
+    """Collects counters, gauges and histograms and renders them in the
+    Prometheus text format. Every method returns immediately while the
+    registry is disabled."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._kinds = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """Increments a counter."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._kinds[name] = 'counter'
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, kind='gauge', **labels):
+        """Sets a gauge, or a counter maintained elsewhere."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._kinds[name] = kind
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        """Adds value to a histogram."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._kinds[name] = 'histogram'
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = Histogram()
+            histogram.observe(value)
+
+    def time(self, name, **labels):
+        """Returns a context manager observing its run time in histogram."""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def expose(self):
+        """Returns all metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._values.items(),
+                                                key=lambda item: item[0]):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append('# TYPE {} {}'.format(name,
+                                                       self._kinds[name]))
+                if isinstance(value, Histogram):
+                    lines.extend(self._expose_histogram(name, labels, value))
+                else:
+                    lines.append('{}{} {}'.format(name, _format_labels(labels),
+                                                  value))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _expose_histogram(name, labels, histogram):
+        cumulative = 0
+        bounds = [repr(bucket) for bucket in histogram.buckets] + ['+Inf']
+        for bound, count in zip(bounds, histogram.counts):
+            cumulative += count
+            yield '{}_bucket{} {}'.format(
+                name, _format_labels(labels + (('le', bound), )), cumulative)
+        yield '{}_sum{} {}'.format(name, _format_labels(labels), histogram.sum)
+        yield '{}_count{} {}'.format(name, _format_labels(labels),
+                                     histogram.count)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+# Registry shared by the models and the controller, disabled until the
+# application enables it.
+registry = Registry()
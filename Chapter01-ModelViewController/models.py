@@ -1,71 +1,132 @@
 import pickle
 
+from allocator import BASE26, BlockAllocator, decode, encode
+from metrics import registry
+from storage import LogStorage
+
+# Histogram of time spent in storage and allocator, labelled by operation.
+STORAGE_SECONDS = 'shortener_storage_seconds'
+
+
+def _load_legacy_last_id():
+    """Returns id of the last short url generated before ids were allocated
+    from a counter, so new ids continue after it."""
+    try:
+        with open('last_short.p', 'rb') as file_:
+            return decode(pickle.load(file_))
+    except IOError:
+        return 0
+
 
 class Url():
+    # Storage of short_url to full_url mappings. Assign another Storage
+    # instance, e.g. SQLiteStorage('short_to_url.db') or
+    # ShardedStorage.from_files(LogStorage, 'short_to_url.{}.log', 8), to
+    # switch backends.
+    storage = LogStorage('short_to_url.log')
+
+    # Short urls are encoded ids from a counter shared by all worker
+    # processes. Changing alphabet of an existing storage may produce short
+    # urls which are already taken.
+    alphabet = BASE26
+    allocator = BlockAllocator('last_id', initial=_load_legacy_last_id())
+
+    # Observers notified with short_url every time its mapping is saved.
+    observers = []
+
+    @classmethod
+    def register_observer(cls, observer):
+        if observer not in cls.observers:
+            cls.observers.append(observer)
+
+    @classmethod
+    def unregister_observer(cls, observer):
+        try:
+            cls.observers.remove(observer)
+        except ValueError:
+            pass
+
+    @classmethod
+    def notify_observers(cls, short_url):
+        for observer in cls.observers:
+            observer.notify(short_url)
+
     @classmethod
     def shorten(cls, full_url):
-        """Shortens full url."""
+        """Shortens full url. A full url shortened before keeps its short url."""
 
         # Create an instance of Url class
         instance = cls()
         instance.full_url = full_url
-        instance.short_url = instance.__create_short_url()
-        Url.__save_url_mapping(instance)
+        with registry.time(STORAGE_SECONDS, operation='lookup'):
+            instance.short_url = cls.storage.get_short_url(full_url)
+        if instance.short_url is None:
+            short_url = instance.__create_short_url()
+            # Another process may have saved full url since the lookup, then
+            # its short url is kept.
+            with registry.time(STORAGE_SECONDS, operation='save'):
+                instance.short_url = cls.storage.add(short_url, full_url)
+            if instance.short_url == short_url:
+                cls.notify_observers(short_url)
         return instance
 
+    @classmethod
+    def shorten_many(cls, full_urls):
+        """Shortens list of full urls, returns Url instances in the same
+        order. All new mappings are allocated and saved in one go."""
+        short_urls = {}
+        new_full_urls = []
+        with registry.time(STORAGE_SECONDS, operation='lookup'):
+            for full_url in full_urls:
+                if full_url in short_urls:
+                    continue
+                short_urls[full_url] = cls.storage.get_short_url(full_url)
+                if short_urls[full_url] is None:
+                    new_full_urls.append(full_url)
+
+        with registry.time(STORAGE_SECONDS, operation='allocate'):
+            ids = cls.allocator.allocate_many(len(new_full_urls))
+        pairs = [(encode(id_, cls.alphabet), full_url)
+                 for id_, full_url in zip(ids, new_full_urls)]
+        with registry.time(STORAGE_SECONDS, operation='save'):
+            saved_short_urls = cls.storage.add_many(pairs)
+        for (short_url, full_url), saved_short_url in zip(pairs,
+                                                          saved_short_urls):
+            short_urls[full_url] = saved_short_url
+            if saved_short_url == short_url:
+                cls.notify_observers(short_url)
+
+        return [cls.__from_mapping(short_urls[full_url], full_url)
+                for full_url in full_urls]
+
     @classmethod
     def get_by_short_url(cls, short_url):
         """Returns Url instance, corresponding to short_url."""
-        url_mapping = Url.__load_url_mapping()
-        return url_mapping.get(short_url)
+        with registry.time(STORAGE_SECONDS, operation='load'):
+            full_url = cls.storage.get(short_url)
+        if full_url is None:
+            return None
+        return cls.__from_mapping(short_url, full_url)
+
+    @classmethod
+    def get_many_by_short_url(cls, short_urls):
+        """Returns list of Url instances corresponding to short_urls, None
+        for unknown ones."""
+        with registry.time(STORAGE_SECONDS, operation='load'):
+            full_urls = cls.storage.get_many(short_urls)
+        return [None if full_url is None else
+                cls.__from_mapping(short_url, full_url)
+                for short_url, full_url in zip(short_urls, full_urls)]
+
+    @classmethod
+    def __from_mapping(cls, short_url, full_url):
+        instance = cls()
+        instance.full_url = full_url
+        instance.short_url = short_url
+        return instance
 
     def __create_short_url(self):
-        """Creates short url, saves it and returns it."""
-        last_short_url = Url.__load_last_short_url()
-        short_url = self.__increment_string(last_short_url)
-        Url.__save_last_short_url(short_url)
-        return short_url
-
-    def __increment_string(self, string):
-        """Increments string, that is:
-        a -> b
-        z -> aa
-        az -> ba
-        empty string -> a
-        """
-        if string == '':
-            return 'a'
-
-        last_char = string[-1]
-        if last_char != 'z':
-            return string[:-1] + chr(ord(last_char) + 1)
-
-        return self.__increment_string(string[:-1]) + 'a'
-
-    @staticmethod
-    def __load_last_short_url():
-        """Returns last generated short url."""
-        try:
-            return pickle.load(open('last_short.p', 'rb'))
-        except IOError:
-            return ''
-
-    @staticmethod
-    def __save_last_short_url(url):
-        """Saves last generated short url."""
-        pickle.dump(url, open('last_short.p', 'wb'))
-
-    @staticmethod
-    def __load_url_mapping():
-        """Returns short_url to Url instance mapping."""
-        try:
-            return pickle.load(open('short_to_url.p', 'rb'))
-        except IOError:
-            return {}
-
-    @staticmethod
-    def __save_url_mapping(instance):
-        """Saves short_url to Url instance mapping."""
-        short_to_url = Url.__load_url_mapping()
-        short_to_url[instance.short_url] = instance
-        pickle.dump(short_to_url, open('short_to_url.p', 'wb'))
+        """Creates short url from a newly allocated id and returns it."""
+        with registry.time(STORAGE_SECONDS, operation='allocate'):
+            id_ = Url.allocator.allocate()
+        return encode(id_, Url.alphabet)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Copies url mappings from one set of shards to another, e.g. to move a
+# single short_to_url.log into 8 shards:
+#
+#   ./reshard.py short_to_url.log 1 'short_to_url.{}.log' 8
+#
+# Stop the application while resharding, mappings saved meanwhile to the
+# source shards are not copied.
+import argparse
+
+from storage import LogStorage, ShardedStorage, SQLiteStorage
+
+BACKENDS = {'log': LogStorage, 'sqlite': SQLiteStorage}
+
+BATCH_SIZE = 10000
+
+
+def reshard(source, target, batch_size=BATCH_SIZE):
+    """Copies all mappings of source storage to target, returns count."""
+    count = 0
+    batch = []
+    for pair in source.items():
+        batch.append(pair)
+        if len(batch) == batch_size:
+            target.put_many(batch)
+            count += len(batch)
+            batch = []
+    target.put_many(batch)
+    return count + len(batch)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('source_pattern')
+    arg_parser.add_argument('source_count', type=int)
+    arg_parser.add_argument('target_pattern')
+    arg_parser.add_argument('target_count', type=int)
+    arg_parser.add_argument('--backend', default='log',
+                            choices=sorted(BACKENDS))
+    args = arg_parser.parse_args()
+
+    backend = BACKENDS[args.backend]
+    source = ShardedStorage.from_files(backend, args.source_pattern,
+                                       args.source_count)
+    target = ShardedStorage.from_files(backend, args.target_pattern,
+                                       args.target_count)
+    count = reshard(source, target)
+    if backend is LogStorage:
+        for shard in target.shards:
+            shard.checkpoint()
+
+    print("Copied {} mappings into {} shards".format(count,
+                                                     args.target_count))
@@ -0,0 +1,493 @@
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import zlib
+from abc import ABCMeta, abstractmethod
+
+
+def hash_url(full_url):
+    """Returns fixed size key of full_url for the reverse index."""
+    return hashlib.sha1(full_url.encode('utf-8')).digest()
+
+
+class Storage(metaclass=ABCMeta):
+    """Interface for storages of short_url to full_url mappings."""
+
+    @abstractmethod
+    def get(self, short_url):
+        """Returns full url saved under short_url or None."""
+        pass
+
+    def get_many(self, short_urls):
+        """Returns list of full urls saved under short_urls, None if missing."""
+        return [self.get(short_url) for short_url in short_urls]
+
+    def put(self, short_url, full_url):
+        """Saves short_url to full_url mapping."""
+        self.put_many([(short_url, full_url)])
+
+    @abstractmethod
+    def put_many(self, pairs):
+        """Saves (short_url, full_url) pairs in one write."""
+        pass
+
+    def add(self, short_url, full_url):
+        """Saves short_url to full_url mapping unless full_url has a short
+        url already. Returns the short url of full_url."""
+        return self.add_many([(short_url, full_url)])[0]
+
+    def add_many(self, pairs):
+        """Saves (short_url, full_url) pairs of full urls without a short url
+        yet, returns list of short urls of the full urls. Storages override
+        it to look up and save atomically, so two processes never save
+        different short urls of one full url."""
+        short_urls = []
+        new_pairs = []
+        added = {}
+        for short_url, full_url in pairs:
+            existing = added.get(full_url) or self.get_short_url(full_url)
+            if existing is None:
+                added[full_url] = existing = short_url
+                new_pairs.append((short_url, full_url))
+            short_urls.append(existing)
+        self.put_many(new_pairs)
+        return short_urls
+
+    @abstractmethod
+    def get_short_url(self, full_url):
+        """Returns the first short url saved for full_url or None."""
+        pass
+
+    @abstractmethod
+    def items(self):
+        """Yields all saved (short_url, full_url) pairs."""
+        pass
+
+
+class LogStorage(Storage):
+    """Append-only log of mappings with an index of record offsets.
+
+    Every put appends one line to the log, so earlier records are never
+    rewritten. The index maps short_url to the offset of its record, and the
+    reverse index maps hashed full_url to its first short_url. Both are
+    checkpointed next to the log, so opening the storage only replays records
+    appended after the last checkpoint. Records appended by other processes
+    are picked up the same way, on a lookup miss or before our own append.
+
+    The checkpoint file is append-only too: every checkpoint appends a chunk
+    with index entries of the records logged since the previous one, so it
+    takes time proportional to checkpoint_every, not to the size of the log.
+    """
+
+    def __init__(self, filename, checkpoint_every=1000):
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._fd = None
+        self._index = None
+        self._reverse = None
+        self._end = 0
+        self._unsaved = 0
+        self._index_fd = None
+        # Offset in the log up to which records are in the checkpoint file,
+        # and offset in that file after its last valid chunk.
+        self._covered = 0
+        self._index_end = 0
+        # (short_url, offset, hashed full_url) entries not checkpointed yet.
+        self._pending = []
+
+    def get(self, short_url):
+        with self._lock:
+            self._open()
+            offset = self._index.get(short_url)
+            if offset is None:
+                # Another process might have added it after our last read.
+                self._replay()
+                offset = self._index.get(short_url)
+            if offset is None:
+                return None
+            return self._read_record(offset)[1]
+
+    def get_short_url(self, full_url):
+        key = hash_url(full_url)
+        with self._lock:
+            self._open()
+            if key not in self._reverse:
+                self._replay()
+            return self._find_short_url(full_url, key)
+
+    def get_many(self, short_urls):
+        with self._lock:
+            self._open()
+            if any(short_url not in self._index for short_url in short_urls):
+                self._replay()
+            result = []
+            for short_url in short_urls:
+                offset = self._index.get(short_url)
+                result.append(None if offset is None else
+                              self._read_record(offset)[1])
+            return result
+
+    def put_many(self, pairs):
+        self._append(pairs)
+
+    def add_many(self, pairs):
+        return self._append(pairs, only_new=True)
+
+    def items(self):
+        with self._lock:
+            self._open()
+            self._replay()
+            index = dict(self._index)
+            end = self._end
+        offset = 0
+        with open(self.filename, 'rb') as file_:
+            for line in file_:
+                if offset >= end:
+                    break
+                short_url, full_url = json.loads(line.decode('utf-8'))
+                # Skip records overwritten by a later put.
+                if index.get(short_url) == offset:
+                    yield short_url, full_url
+                offset += len(line)
+
+    def checkpoint(self):
+        """Saves the index, so the next open does not replay the whole log."""
+        with self._lock:
+            self._open()
+            self._checkpoint()
+
+    def _open(self):
+        """Opens the log and loads the index on first use."""
+        if self._fd is not None:
+            return
+
+        self._fd = os.open(self.filename, os.O_RDWR | os.O_APPEND | os.O_CREAT)
+        self._index_fd = os.open(self.index_filename, os.O_RDWR | os.O_CREAT)
+        self._index = {}
+        self._reverse = {}
+        self._end = 0
+        self._read_checkpoints()
+        self._replay()
+
+    def _read_checkpoints(self):
+        """Adds entries of chunks appended to the checkpoint file since the
+        last read, which are not in the index yet."""
+        log_size = os.fstat(self._fd).st_size
+        with open(self.index_filename, 'rb') as file_:
+            file_.seek(self._index_end)
+            while True:
+                try:
+                    chunk = pickle.load(file_)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    # A chunk cut by a crash is overwritten by the next one.
+                    return
+                # Chunks must continue each other, and a chunk beyond the end
+                # of the log belongs to another log.
+                if not isinstance(chunk, dict) or \
+                        chunk.get('start') != self._covered or \
+                        chunk['end'] > log_size:
+                    return
+                if chunk['end'] > self._end:
+                    for short_url, offset, key in chunk['entries']:
+                        if offset >= self._end:
+                            self._index[short_url] = offset
+                            self._reverse.setdefault(key, short_url)
+                    self._end = chunk['end']
+                self._covered = chunk['end']
+                self._index_end = file_.tell()
+
+    def _replay(self):
+        """Adds records appended after self._end to the index."""
+        if os.fstat(self._fd).st_size <= self._end:
+            return
+
+        with open(self.filename, 'rb') as file_:
+            file_.seek(self._end)
+            for line in file_:
+                # A record being written is picked up on the next replay, a
+                # record cut by a crash is dropped by the next put_many.
+                if not line.endswith(b'\n'):
+                    break
+                short_url, full_url = json.loads(line.decode('utf-8'))
+                self._add_to_index(short_url, full_url, self._end)
+                self._end += len(line)
+
+    def _append(self, pairs, only_new=False):
+        """Appends records of pairs to the log, with only_new those of full
+        urls without a short url only. Returns list of short urls of the
+        full urls."""
+        pairs = list(pairs)
+        if not pairs:
+            return []
+
+        with self._lock:
+            self._open()
+            short_urls = []
+            new_pairs = []
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Catch up with other writers, so self._end is the offset
+                # our records are appended at, and full urls they saved are
+                # found.
+                self._replay()
+                # Holding the lock, a record after self._end was cut by a
+                # crash of its writer, drop it.
+                if os.fstat(self._fd).st_size > self._end:
+                    os.ftruncate(self._fd, self._end)
+                added = {}
+                for short_url, full_url in pairs:
+                    if only_new:
+                        existing = added.get(full_url) or \
+                            self._find_short_url(full_url, hash_url(full_url))
+                        if existing is not None:
+                            short_urls.append(existing)
+                            continue
+                        added[full_url] = short_url
+                    short_urls.append(short_url)
+                    new_pairs.append((short_url, full_url))
+                records = [(json.dumps(pair) + '\n').encode('utf-8')
+                           for pair in new_pairs]
+                self._write(b''.join(records))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            for (short_url, full_url), record in zip(new_pairs, records):
+                self._add_to_index(short_url, full_url, self._end)
+                self._end += len(record)
+            self._unsaved += len(records)
+            if self._unsaved >= self.checkpoint_every:
+                self._checkpoint()
+            return short_urls
+
+    def _find_short_url(self, full_url, key):
+        """Returns the first short url of full_url in the index or None."""
+        short_url = self._reverse.get(key)
+        if short_url is None:
+            return None
+        # Guard against a hash collision.
+        if self._read_record(self._index[short_url])[1] != full_url:
+            return None
+        return short_url
+
+    def _add_to_index(self, short_url, full_url, offset):
+        key = hash_url(full_url)
+        self._index[short_url] = offset
+        self._reverse.setdefault(key, short_url)
+        self._pending.append((short_url, offset, key))
+
+    def _write(self, data):
+        """Appends data to the log, even if os.write writes it partially."""
+        while data:
+            written = os.write(self._fd, data)
+            data = data[written:]
+
+    def _read_record(self, offset):
+        """Returns (short_url, full_url) record written at offset."""
+        chunks = []
+        while True:
+            chunk = os.pread(self._fd, 4096, offset)
+            newline = chunk.find(b'\n')
+            if newline != -1 or not chunk:
+                chunks.append(chunk[:newline])
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return json.loads(b''.join(chunks).decode('utf-8'))
+
+    def _checkpoint(self):
+        """Appends a chunk of entries logged after the checkpointed ones."""
+        fcntl.flock(self._index_fd, fcntl.LOCK_EX)
+        try:
+            # Other processes might have checkpointed some of the records.
+            self._read_checkpoints()
+            if self._end > self._covered:
+                data = pickle.dumps({
+                    'start': self._covered,
+                    'end': self._end,
+                    'entries': [entry for entry in self._pending
+                                if entry[1] >= self._covered]
+                })
+                # Drop anything after the last valid chunk.
+                os.ftruncate(self._index_fd, self._index_end)
+                offset = self._index_end
+                while data:
+                    written = os.pwrite(self._index_fd, data, offset)
+                    data = data[written:]
+                    offset += written
+                self._covered = self._end
+                self._index_end = offset
+        finally:
+            fcntl.flock(self._index_fd, fcntl.LOCK_UN)
+        self._pending = []
+        self._unsaved = 0
+
+
+class SQLiteStorage(Storage):
+    """Storage backed by an SQLite table indexed by short_url and by hashed
+    full_url."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._local = threading.local()
+
+    def get(self, short_url):
+        row = self._connection().execute(
+            'SELECT full_url FROM urls WHERE short_url = ?',
+            (short_url, )).fetchone()
+        return row[0] if row else None
+
+    def get_short_url(self, full_url):
+        return self._select_short_url(self._connection(), full_url)
+
+    def put_many(self, pairs):
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO urls VALUES (?, ?, ?)',
+                ((short_url, full_url, hash_url(full_url))
+                 for short_url, full_url in pairs))
+
+    def add_many(self, pairs):
+        connection = self._connection()
+        short_urls = []
+        with connection:
+            # Take the write lock before looking up, so no other process
+            # saves one of the full urls meanwhile.
+            connection.execute('BEGIN IMMEDIATE')
+            for short_url, full_url in pairs:
+                existing = self._select_short_url(connection, full_url)
+                if existing is None:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO urls VALUES (?, ?, ?)',
+                        (short_url, full_url, hash_url(full_url)))
+                    existing = short_url
+                short_urls.append(existing)
+        return short_urls
+
+    def items(self):
+        cursor = self._connection().execute(
+            'SELECT short_url, full_url FROM urls')
+        for row in cursor:
+            yield row[0], row[1]
+
+    @staticmethod
+    def _select_short_url(connection, full_url):
+        row = connection.execute(
+            'SELECT short_url FROM urls WHERE full_hash = ? AND full_url = ? '
+            'ORDER BY rowid LIMIT 1', (hash_url(full_url), full_url)).fetchone()
+        return row[0] if row else None
+
+    def _connection(self):
+        """Returns a connection of the current thread, creates it if needed."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename)
+            # WAL lets readers proceed while another process writes.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS urls ('
+                               'short_url TEXT UNIQUE NOT NULL, '
+                               'full_url TEXT NOT NULL, '
+                               'full_hash BLOB NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS urls_full_hash '
+                               'ON urls (full_hash)')
+            self._local.connection = connection
+        return connection
+
+
+class ShardedStorage(Storage):
+    """Spreads mappings over shards by hash of short_url.
+
+    Every shard is a storage with its own files and lock, so saves falling
+    into different shards do not wait for each other. A batch is saved with
+    one write per shard, atomic per shard only. A mapping is also saved to
+    the shard of hash of its full_url, if that is another one, so a reverse
+    lookup asks that shard only.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    @classmethod
+    def from_files(cls, storage_class, filename_pattern, count):
+        """Creates count shards of storage_class, filename_pattern is
+        formatted with the shard number, e.g. 'short_to_url.{}.log'."""
+        return cls([storage_class(filename_pattern.format(number))
+                    for number in range(count)])
+
+    def shard_number(self, short_url):
+        return zlib.crc32(short_url.encode('utf-8')) % len(self.shards)
+
+    def reverse_shard_number(self, full_url):
+        return zlib.crc32(full_url.encode('utf-8')) % len(self.shards)
+
+    def get(self, short_url):
+        return self.shards[self.shard_number(short_url)].get(short_url)
+
+    def get_many(self, short_urls):
+        result = [None] * len(short_urls)
+        for number, positions in self._group(short_urls).items():
+            full_urls = self.shards[number].get_many(
+                [short_urls[position] for position in positions])
+            for position, full_url in zip(positions, full_urls):
+                result[position] = full_url
+        return result
+
+    def get_short_url(self, full_url):
+        return self.shards[self.reverse_shard_number(full_url)].get_short_url(
+            full_url)
+
+    def put_many(self, pairs):
+        groups = {}
+        for short_url, full_url in pairs:
+            number = self.shard_number(short_url)
+            groups.setdefault(number, []).append((short_url, full_url))
+            reverse_number = self.reverse_shard_number(full_url)
+            if reverse_number != number:
+                groups.setdefault(reverse_number, []).append(
+                    (short_url, full_url))
+        for number, group in groups.items():
+            self.shards[number].put_many(group)
+
+    def add_many(self, pairs):
+        pairs = list(pairs)
+        # Mappings are saved to shards of their short urls first, so a
+        # short url found by a reverse lookup is always saved. A mapping
+        # lost to another process stays there as an unused alias.
+        groups = {}
+        reverse_groups = {}
+        for position, (short_url, full_url) in enumerate(pairs):
+            number = self.shard_number(short_url)
+            reverse_number = self.reverse_shard_number(full_url)
+            if reverse_number != number:
+                groups.setdefault(number, []).append((short_url, full_url))
+            reverse_groups.setdefault(reverse_number, []).append(position)
+        for number, group in groups.items():
+            self.shards[number].put_many(group)
+
+        short_urls = [None] * len(pairs)
+        for number, positions in reverse_groups.items():
+            saved_short_urls = self.shards[number].add_many(
+                [pairs[position] for position in positions])
+            for position, short_url in zip(positions, saved_short_urls):
+                short_urls[position] = short_url
+        return short_urls
+
+    def items(self):
+        for number, shard in enumerate(self.shards):
+            for short_url, full_url in shard.items():
+                # Skip copies saved for reverse lookups.
+                if self.shard_number(short_url) == number:
+                    yield short_url, full_url
+
+    def _group(self, short_urls):
+        """Returns shard number to positions of its short_urls mapping."""
+        groups = {}
+        for position, short_url in enumerate(short_urls):
+            groups.setdefault(self.shard_number(short_url),
+                              []).append(position)
+        return groups
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# Measures throughput of crawler.py against a synthetic site served from a
+# local HTTP server, so results do not depend on a remote site.
+#
+# Page n of the site links to fanout other pages and shows images images of
+# image_size bytes, all different. For every count of pages, traverse_site
+# and download_images crawl a fresh copy of the site in a new process, then
+# pages/s, images/s, bytes/s, peak memory of that process and time spent
+# parsing per page are printed. Example:
+#
+#   ./benchmark.py --pages 100 1000 --fanout 10 --images 5 --image-size 20000
+import argparse
+import contextlib
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import crawler
+from checkpoint import Checkpoint
+from connectionpool import ConnectionPool
+from extractor import PageCache, extract_stream
+from frontier import Frontier, SeenSet
+from imagestore import ImageStore
+from politeness import HostRateLimiter, RobotsCache
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Serves the synthetic site described by attributes of the server."""
+
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, otherwise delayed ACKs stall
+    # every keep-alive response for tens of milliseconds.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        site = self.server
+        path = self.path
+        if path.startswith('/page/'):
+            number = int(path[len('/page/'):])
+            links = ''.join(
+                '<li><a href="/page/{}">Page</a></li>'.format(
+                    (number * site.fanout + i) % site.pages)
+                for i in range(1, site.fanout + 1))
+            images = ''.join(
+                '<img src="/image/{}-{}.png" alt="">'.format(number, i)
+                for i in range(site.images))
+            body = ('<html><head><title>Page {}</title></head><body>'
+                    '<p>{}</p><ul>{}</ul>{}</body></html>').format(
+                        number, site.filler, links, images).encode()
+            content_type = 'text/html; charset=utf-8'
+        elif path.startswith('/image/'):
+            # Every image differs from others by its path.
+            body = path.encode() + site.image_body
+            content_type = 'image/png'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with site.lock:
+            site.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(pages, fanout, images, image_size, page_size):
+    """Starts serving the site in a thread, returns the server."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.fanout = fanout
+    server.images = images
+    server.image_body = bytes(range(256)) * (image_size // 256) + \
+        bytes(image_size % 256)
+    server.filler = ('Lorem ipsum dolor sit amet. ' * (page_size // 28 + 1))
+    server.bytes_sent = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ParseTimer():
+    """Replaces crawler.extract_stream to sum time spent parsing, without
+    time spent waiting for the chunks from network."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.pages = 0
+
+    def __call__(self, chunks, charset='utf-8'):
+        reading = [0.0]
+
+        def timed_chunks():
+            iterator = iter(chunks)
+            while True:
+                start = time.perf_counter()
+                chunk = next(iterator, None)
+                reading[0] += time.perf_counter() - start
+                if chunk is None:
+                    return
+                yield chunk
+
+        start = time.perf_counter()
+        page = extract_stream(timed_chunks(), charset)
+        self.seconds += time.perf_counter() - start - reading[0]
+        self.pages += 1
+        return page
+
+
+def run(port, pages, downloaders):
+    """Crawls up to pages pages of the site served on port with crawler.py,
+    returns (pages, images, crawl seconds, download seconds, parse seconds
+    per page)."""
+    root = 'http://127.0.0.1:{}/page/0'.format(port)
+    parse_timer = ParseTimer()
+    crawler.extract_stream = parse_timer
+    crawler.parsed_root = urlparse(root)
+
+    with tempfile.TemporaryDirectory() as directory:
+        singleton = crawler.Singleton()
+        singleton.checkpoint = Checkpoint(directory + '/crawl_state.json')
+        singleton.frontier = Frontier([root])
+        singleton.to_visit = Frontier()
+        singleton.checkpoint.track(frontier=singleton.frontier,
+                                   to_visit=singleton.to_visit)
+        singleton.downloaded = SeenSet()
+        singleton.pool = ConnectionPool()
+        singleton.limiter = HostRateLimiter()
+        singleton.robots = RobotsCache(singleton.pool, singleton.limiter)
+        singleton.page_cache = PageCache()
+        singleton.images = ImageStore(directory + '/images')
+
+        start = time.perf_counter()
+        crawler.traverse_site(max_links=pages)
+        crawled = time.perf_counter()
+        threads = [threading.Thread(target=crawler.download_images,
+                                    args=('Thread-{}'.format(i + 1),))
+                   for i in range(downloaders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        downloaded = time.perf_counter()
+        singleton.pool.close()
+
+        return (len(singleton.to_visit.seen), len(singleton.images.index),
+                crawled - start, downloaded - crawled,
+                parse_timer.seconds / max(parse_timer.pages, 1))
+
+
+def measure(port, pages, downloaders):
+    """Runs run in a worker process, returns its results followed by peak
+    resident memory of the process in megabytes."""
+    # Keep output of the crawler out of the table.
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        results = run(port, pages, downloaders)
+    # ru_maxrss is in kilobytes on Linux.
+    return results + (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', type=int, nargs='+',
+                            default=[100, 1000])
+    arg_parser.add_argument('--fanout', type=int, default=10,
+                            help="links on a page")
+    arg_parser.add_argument('--images', type=int, default=5,
+                            help="images on a page")
+    arg_parser.add_argument('--image-size', type=int, default=20000,
+                            help="bytes of an image")
+    arg_parser.add_argument('--page-size', type=int, default=10000,
+                            help="bytes of text on a page")
+    arg_parser.add_argument('--downloaders', type=int, default=2,
+                            help="threads downloading images")
+    args = arg_parser.parse_args()
+
+    print('{:>7} {:>9} {:>9} {:>10} {:>12} {:>13}'.format(
+        'pages', 'pages/s', 'images/s', 'MB/s', 'peak RSS MB',
+        'parse us/page'))
+    for pages in args.pages:
+        server = serve(pages, args.fanout, args.images, args.image_size,
+                       args.page_size)
+        try:
+            # ru_maxrss is the peak of a whole process, so every count of
+            # pages is crawled in a new process to measure its own peak.
+            with ProcessPoolExecutor(
+                    1, multiprocessing.get_context('spawn')) as executor:
+                (crawled_pages, images, crawl_seconds, download_seconds,
+                 parse_seconds, peak) = executor.submit(
+                     measure, server.server_address[1], pages,
+                     args.downloaders).result()
+            bytes_sent = server.bytes_sent
+        finally:
+            server.shutdown()
+            server.server_close()
+        print('{:>7} {:>9.1f} {:>9.1f} {:>10.2f} {:>12.1f} {:>13.1f}'.format(
+            crawled_pages, crawled_pages / crawl_seconds,
+            images / download_seconds,
+            bytes_sent / (crawl_seconds + download_seconds) / 1e6, peak,
+            parse_seconds * 1e6))
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+
+PAGES_SUFFIX = '.pages.jsonl'
+
+
+class Checkpoint():
+    """Crawl state saved to files, so a crawl can be resumed.
+
+    For every crawled page, its ETag and Last-Modified headers along with
+    links and images found on it are appended to the filename + '.pages.jsonl'
+    journal as soon as the page is parsed. Snapshots of the tracked frontiers
+    are written to filename at most every save_interval seconds. An
+    unfinished crawl is resumed from the saved frontiers. A repeated crawl
+    sends conditional requests and reuses links and images of pages answered
+    with 304 Not Modified.
+    """
+
+    def __init__(self, filename='crawl_state.json', save_interval=5.0):
+        self.filename = filename
+        self.pages_filename = filename + PAGES_SUFFIX
+        self.save_interval = save_interval
+        self.frontiers = {}
+        self.pages = {}
+        self._saved_frontiers = {}
+        self._finished = True
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+        lines = self._load_pages()
+        if lines > 2 * len(self.pages):
+            # Most lines are of pages crawled again, keep the latest ones.
+            self._rewrite_pages()
+        self._pages_file = open(self.pages_filename, 'a')
+
+        try:
+            with open(filename) as file_:
+                state = json.load(file_)
+        except (IOError, ValueError):
+            return
+        self._saved_frontiers = state['frontiers']
+        self._finished = state['finished']
+
+    def unfinished(self):
+        """Returns names to snapshots of the saved frontiers if the saved
+        crawl was interrupted, otherwise an empty dict."""
+        return {} if self._finished else self._saved_frontiers
+
+    def track(self, **frontiers):
+        """Sets frontiers saved by save, by their names."""
+        self.frontiers = frontiers
+
+    def conditional_headers(self, url):
+        """Returns headers to request url only if it was modified."""
+        page = self.pages.get(url)
+        headers = {}
+        if page and page.get('etag'):
+            headers['If-None-Match'] = page['etag']
+        if page and page.get('last-modified'):
+            headers['If-Modified-Since'] = page['last-modified']
+        return headers
+
+    def remember_page(self, url, response, links, images):
+        """Appends validators of response and links and images of page to
+        the journal."""
+        page = {
+            'etag': response.get('etag'),
+            'last-modified': response.get('last-modified'),
+            'links': links,
+            'images': images
+        }
+        line = json.dumps([url, page]) + '\n'
+        with self._lock:
+            self.pages[url] = page
+            self._pages_file.write(line)
+            self._pages_file.flush()
+
+    def cached_page(self, url):
+        """Returns (links, images) remembered for url."""
+        page = self.pages[url]
+        return page['links'], page['images']
+
+    def page_done(self):
+        """Saves frontiers if save_interval passed since the last save."""
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self, finished=False):
+        """Writes snapshots of frontiers to a temporary file and renames it
+        over the old one, so a crash never leaves a partially written state.
+        Pass finished=True when the crawl is complete."""
+        self._saved_at = time.monotonic()
+        frontiers = {name: frontier.snapshot()
+                     for name, frontier in self.frontiers.items()}
+        state = json.dumps({'frontiers': frontiers, 'finished': finished})
+        with self._lock:
+            tmp_filename = self.filename + '.tmp'
+            with open(tmp_filename, 'w') as file_:
+                file_.write(state)
+            os.replace(tmp_filename, self.filename)
+
+    def _load_pages(self):
+        """Reads the journal, later lines replace earlier ones. Returns count
+        of lines."""
+        lines = 0
+        try:
+            with open(self.pages_filename) as file_:
+                for line in file_:
+                    try:
+                        url, page = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut by a crash.
+                        continue
+                    self.pages[url] = page
+                    lines += 1
+        except IOError:
+            pass
+        return lines
+
+    def _rewrite_pages(self):
+        tmp_filename = self.pages_filename + '.tmp'
+        with open(tmp_filename, 'w') as file_:
+            for url, page in self.pages.items():
+                file_.write(json.dumps([url, page]) + '\n')
+        os.replace(tmp_filename, self.pages_filename)
@@ -0,0 +1,170 @@
+import http.client
+import threading
+from urllib.parse import urljoin, urlsplit
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection to a host gets free in time."""
+    pass
+
+
+class Response(dict):
+    """Response headers with lowercase names, like httplib2 returns them.
+
+    status is the HTTP status code and url is the final url after
+    redirects.
+    """
+
+    def __init__(self, status, headers, url):
+        super(Response, self).__init__(
+            (name.lower(), value) for name, value in headers)
+        self.status = status
+        self.url = url
+
+
+class PooledResponse():
+    """A streamed response which gives its connection back to the pool when
+    closed. Use it as a context manager."""
+
+    def __init__(self, pool, key, connection, response, url):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.headers = Response(response.status, response.getheaders(), url)
+        self.status = response.status
+        self.url = url
+        self.closed = False
+
+    def read(self, amount=None):
+        return self.response.read(amount)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # A connection can be reused only if the whole body was read.
+        reusable = self.response.isclosed() and not self.response.will_close
+        if not reusable:
+            self.response.close()
+        self.pool.release(self.key, self.connection, reusable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConnectionPool():
+    """Keeps keep-alive connections per (scheme, host, port) for all threads.
+
+    At most max_per_host connections to a host exist at once. A thread
+    wanting one more waits up to pool_timeout seconds for another thread to
+    release one. timeout is the socket timeout of every connection.
+    """
+
+    def __init__(self, max_per_host=4, timeout=10, pool_timeout=60,
+                 max_redirects=5):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout
+        self.max_redirects = max_redirects
+        self._idle = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def request(self, url, headers=None):
+        """Returns (Response, body) of GET request to url."""
+        with self.open(url, headers) as response:
+            body = response.read()
+        return response.headers, body
+
+    def open(self, url, headers=None):
+        """Sends GET request to url following redirects, returns
+        PooledResponse to read the body from."""
+        for _ in range(self.max_redirects + 1):
+            response = self._open(url, headers or {})
+            location = response.headers.get('location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            # Read the rest of redirect body, so the connection is reusable.
+            response.read()
+            response.close()
+            url = urljoin(url, location)
+        raise http.client.HTTPException("Too many redirects: " + url)
+
+    def release(self, key, connection, reusable):
+        """Gives connection back to the pool, closes it if not reusable."""
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(key, []).append(connection)
+        else:
+            connection.close()
+        self._slots[key].release()
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _open(self, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection, retry
+                # once with a fresh one.
+                connection.close()
+                connection = self._connect(key)
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+        except Exception:
+            self.release(key, connection, False)
+            raise
+        return PooledResponse(self, key, connection, response, url)
+
+    def _acquire(self, key):
+        """Returns (connection, reused) to the key host."""
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = self._slots[key] = threading.BoundedSemaphore(
+                    self.max_per_host)
+        if not slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeout("No free connection to {}".format(key[1]))
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        try:
+            return self._connect(key), False
+        except Exception:
+            slots.release()
+            raise
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port,
+                                               timeout=self.timeout)
+        if scheme == 'http':
+            return http.client.HTTPConnection(host, port,
+                                              timeout=self.timeout)
+        raise ValueError("Unsupported scheme: {}".format(scheme))
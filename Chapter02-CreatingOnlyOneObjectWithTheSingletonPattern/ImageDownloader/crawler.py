@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 
 import threading
-import os
 import re
 from urllib.parse import urlparse, urljoin
-from urllib.request import urlretrieve
 
-import httplib2
-from bs4 import BeautifulSoup
+from checkpoint import Checkpoint
+from connectionpool import ConnectionPool
+from extractor import PageCache, extract_stream, get_charset
+from frontier import Frontier, SeenSet
+from imagestore import ImageStore
+from politeness import HostRateLimiter, RobotsCache
+
+PAGE_CHUNK_SIZE = 16 * 1024
 
 
 class Singleton():
@@ -30,98 +34,132 @@ class ImageDownloaderThread(threading.Thread):
         print("Finished thread {}".format(self.name))
 
 
-def traverse_site(max_links=10):
-    link_parser_singleton = Singleton()
+def to_site_url(link_url, parsed_root):
+    """Returns full url of a link, which can be relative, or None if link
+    follows to external webpage."""
+    parsed = urlparse(link_url)
 
-    # While we have pages to parse in queue.
-    while link_parser_singleton.queue_to_parse:
-        # If collected enough links to download images, return.
-        if len(link_parser_singleton.to_visit) == max_links:
-            return
+    # If link follows to external webpage, skip it.
+    if parsed.netloc and parsed.netloc != parsed_root.netloc:
+        return None
 
-        url = link_parser_singleton.queue_to_parse.pop()
+    # Construct a full url from a link which can be relative.
+    return (parsed.scheme or parsed_root.scheme) + '://' + \
+            (parsed.netloc or parsed_root.netloc) + parsed.path or ''
 
-        http = httplib2.Http()
-        try:
-            status, response = http.request(url)
-        except Exception:
-            continue
 
+def fetch_page(url):
+    """Returns (links, images) lists of href and src attributes found on the
+    web page at url, or None if url is not a web page. A page is parsed once
+    per crawl, and a page not modified since a previous crawl is not
+    downloaded and parsed again. Returns None as well if robots.txt of the
+    site disallows url."""
+    singleton = Singleton()
+    checkpoint = singleton.checkpoint
+
+    page = singleton.page_cache.get(url)
+    if page is not None:
+        return page
+
+    if not singleton.robots.allowed(url):
+        return None
+    # Wait until the site allows one more request.
+    singleton.limiter.acquire(url)
+    with singleton.pool.open(url,
+                             checkpoint.conditional_headers(url)) as response:
+        status = response.headers
+        if status.status == 304:
+            response.read()
+            page = checkpoint.cached_page(url)
         # Skip if not a web page.
-        if 'text/html' not in status.get('content-type'):
-            continue
+        elif 'text/html' not in status.get('content-type', ''):
+            return None
+        else:
+            # Find links and images in one pass while the page streams in.
+            chunks = iter(lambda: response.read(PAGE_CHUNK_SIZE), b'')
+            page = extract_stream(chunks, get_charset(status['content-type']))
+            checkpoint.remember_page(url, status, *page)
 
-        # Add the link to queue for downloading images.
-        link_parser_singleton.to_visit.add(url)
-        print("Added {} to queue".format(url))
+    singleton.page_cache.put(url, page)
+    return page
 
-        bs = BeautifulSoup(response, 'html.parser')
 
-        for link in BeautifulSoup.findAll(bs, 'a'):
-            link_url = link.get('href')
-            # <img> tag may not contain href attribute.
-            if not link_url:
-                continue
+def traverse_site(max_links=10):
+    link_parser_singleton = Singleton()
 
-            parsed = urlparse(link_url)
+    while True:
+        # If collected enough links to download images, return.
+        if len(link_parser_singleton.to_visit.seen) >= max_links:
+            return
 
-            # If link follows to external webpage, skip it.
-            if parsed.netloc and parsed.netloc != parsed_root.netloc:
-                continue
+        # Return when there are no pages to parse in queue.
+        url = link_parser_singleton.frontier.pop()
+        if url is None:
+            return
 
-            # Construct a full url from a link which can be relative.
-            link_url = (parsed.scheme or parsed_root.scheme) + '://' + \
-                    (parsed.netloc or parsed_root.netloc) + parsed.path or ''
+        try:
+            page = fetch_page(url)
+        except Exception:
+            page = None
+
+        if page is not None:
+            # Add the link to queue for downloading images.
+            link_parser_singleton.to_visit.add(url)
+            print("Added {} to queue".format(url))
 
-            # If link was dded previously, skip it.
-            if link_url in link_parser_singleton.to_visit:
-                continue
+            for link_url in page[0]:
+                link_url = to_site_url(link_url, parsed_root)
+                if not link_url:
+                    continue
 
-            # Add a link for further parsing.
-            link_parser_singleton.queue_to_parse = [
-                link_url
-            ] + link_parser_singleton.queue_to_parse
+                # Add a link for further parsing, frontier skips links which
+                # were added previously.
+                link_parser_singleton.frontier.add(link_url)
+
+        # Mark the page as crawled only after its links are in the frontier,
+        # so a resumed crawl does not miss them.
+        link_parser_singleton.frontier.task_done(url)
+        link_parser_singleton.checkpoint.page_done()
 
 
 def download_images(thread_name):
     singleton = Singleton()
     # While we have pages where we have not downloaded images.
-    while singleton.to_visit:
+    while True:
         url = singleton.to_visit.pop()
+        if url is None:
+            return
 
-        http = httplib2.Http()
         print("{} Starting downloading images from {}".format(thread_name,
                                                               url))
 
         try:
-            status, response = http.request(url)
+            page = fetch_page(url)
         except Exception:
-            continue
-
-        bs = BeautifulSoup(response, 'html.parser')
+            page = None
 
-        # Find all <img> tags.
-        images = BeautifulSoup.findAll(bs, 'img')
-
-        for image in images:
-            # Get image source url which can be absolute or relative
-            src = image.get('src')
+        # Get image source urls which can be absolute or relative.
+        for src in page[1] if page else []:
             # Construct a full url. If the image url is relative,
             # it will be prepended with webpage domain.
             # If the image ural is absolute it will remain as is
             src = urljoin(url, src)
 
-            # Get a base name, for example 'image.png' to name file locally
-            basename = os.path.basename(src)
-
-            if src not in singleton.downloaded:
-                singleton.downloaded.add(src)
+            # Only one thread gets True for the same src.
+            if singleton.downloaded.add(src) and \
+                    singleton.robots.allowed(src):
                 print("Downloading {}".format(src))
-                # Download image to local filesystem.
-                urlretrieve(src, os.path.join('images', basename))
-
-            print("{} finished downloading images from {}".format(thread_name,
-                                                                  url))
+                try:
+                    singleton.limiter.acquire(src)
+                    # Store image to local filesystem, named by its content.
+                    singleton.images.download(singleton.pool, src)
+                except Exception as e:
+                    print("Can not download {}: {}".format(src, e))
+
+        print("{} finished downloading images from {}".format(thread_name,
+                                                              url))
+        singleton.to_visit.task_done(url)
+        singleton.checkpoint.page_done()
 
 
 if __name__ == '__main__':
@@ -130,18 +168,34 @@ if __name__ == '__main__':
     parsed_root = urlparse(root)
 
     singleton = Singleton()
-    singleton.queue_to_parse = [root]
-    # A set of urls to download images from.
-    singleton.to_visit = set()
+    # Crawl state, saved periodically to resume the crawl after a crash.
+    singleton.checkpoint = Checkpoint('crawl_state.json')
+    unfinished = singleton.checkpoint.unfinished()
+    if unfinished:
+        print("Resuming unfinished crawl")
+        singleton.frontier = Frontier.restore(unfinished['frontier'])
+        singleton.to_visit = Frontier.restore(unfinished['to_visit'])
+    else:
+        # Pages to parse for links.
+        singleton.frontier = Frontier([root])
+        # Pages to download images from.
+        singleton.to_visit = Frontier()
+    singleton.checkpoint.track(frontier=singleton.frontier,
+                               to_visit=singleton.to_visit)
     # Downloaded images.
-    singleton.downloaded = set()
+    singleton.downloaded = SeenSet()
+    # Keep-alive connections shared by all threads.
+    singleton.pool = ConnectionPool()
+    # Requests per second to a site, lower if its robots.txt asks so.
+    singleton.limiter = HostRateLimiter(rate=2, burst=2)
+    singleton.robots = RobotsCache(singleton.pool, singleton.limiter)
+    # Links and images of parsed pages.
+    singleton.page_cache = PageCache()
+    # Downloaded images, it creates images directory if not exists.
+    singleton.images = ImageStore('images')
 
     traverse_site()
 
-    # Create images directory if not exists.
-    if not os.path.exists('images'):
-        os.makedirs('images')
-
     # Create new threads.
     thread1 = ImageDownloaderThread(1, "Thread-1", 1)
     thread2 = ImageDownloaderThread(2, "Thread-2", 2)
@@ -149,3 +203,7 @@ if __name__ == '__main__':
     # Start new Threads
     thread1.start()
     thread2.start()
+
+    thread1.join()
+    thread2.join()
+    singleton.checkpoint.save(finished=True)
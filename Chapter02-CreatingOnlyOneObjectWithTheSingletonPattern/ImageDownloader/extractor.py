@@ -0,0 +1,98 @@
+import codecs
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+
+class LinkExtractor(HTMLParser):
+    """Collects href of <a> tags and src of <img> tags in a single pass.
+
+    It reacts to start tags only and builds no tree, so memory use does not
+    grow with the size of the page.
+    """
+
+    def __init__(self):
+        super(LinkExtractor, self).__init__(convert_charrefs=True)
+        self.links = []
+        self.images = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._collect(attrs, 'href', self.links)
+        elif tag == 'img':
+            self._collect(attrs, 'src', self.images)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    @staticmethod
+    def _collect(attrs, name, found):
+        for attr_name, value in attrs:
+            # Tags may not contain the attribute or have it empty.
+            if attr_name == name and value:
+                found.append(value)
+                return
+
+
+def get_charset(content_type, default='utf-8'):
+    """Returns charset parameter of Content-Type header value."""
+    for parameter in content_type.split(';')[1:]:
+        name, _, value = parameter.strip().partition('=')
+        if name.lower() == 'charset' and value:
+            return value.strip('"\'')
+    return default
+
+
+def extract(content, charset='utf-8'):
+    """Returns (links, images) lists of href and src attributes found in
+    content, which is HTML as bytes in charset or str."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+        charset = 'utf-8'
+    return extract_stream([content], charset)
+
+
+def extract_stream(chunks, charset='utf-8'):
+    """Like extract, but takes HTML as an iterable of byte chunks and parses
+    every chunk as soon as it arrives."""
+    try:
+        decoder = codecs.getincrementaldecoder(charset)('replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    extractor = LinkExtractor()
+    for chunk in chunks:
+        extractor.feed(decoder.decode(chunk))
+    extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    return extractor.links, extractor.images
+
+
+def extract_many(pages):
+    """Returns a list of (links, images) of every (content, charset) in
+    pages. Worker processes get pages in such batches, so one round trip
+    between processes carries many pages."""
+    return [extract(content, charset) for content, charset in pages]
+
+
+class PageCache():
+    """Keeps (links, images) of the recently extracted pages by url, so a
+    page is parsed once however many stages need it."""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            page = self._pages.get(url)
+            if page is not None:
+                self._pages.move_to_end(url)
+            return page
+
+    def put(self, url, page):
+        with self._lock:
+            self._pages[url] = page
+            self._pages.move_to_end(url)
+            if len(self._pages) > self.capacity:
+                self._pages.popitem(last=False)
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+
+
+class SeenSet():
+    """A thread-safe set whose add tells if the item is new."""
+
+    def __init__(self, items=()):
+        self._items = set(items)
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        """Adds item, returns False if it was added before."""
+        with self._lock:
+            if item in self._items:
+                return False
+            self._items.add(item)
+            return True
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._items))
+
+
+class Frontier():
+    """A thread-safe FIFO queue of urls to crawl.
+
+    Every url is queued at most once: urls which are queued, being crawled or
+    already crawled are all in self.seen, and crawled ones in self.done.
+    Both add and pop take O(1) time. Like queue.Queue, it counts unfinished
+    urls for task_done and join, and subclasses can change the order in which
+    urls are popped by overriding _put, _get, _queued and _wait_time.
+    """
+
+    def __init__(self, urls=(), max_urls=None):
+        """max_urls limits count of urls ever added, None means no limit."""
+        self.max_urls = max_urls
+        self.seen = SeenSet()
+        self.done = SeenSet()
+        self._queue = deque()
+        self._unfinished = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        """Queues url, returns False if it was seen before or limit is hit."""
+        with self._lock:
+            if self.max_urls is not None and len(self.seen) >= self.max_urls:
+                return False
+            if not self.seen.add(url):
+                return False
+            self._put(url)
+            self._unfinished += 1
+            self._not_empty.notify()
+            return True
+
+    def pop(self, block=False, timeout=None):
+        """Returns the oldest queued url.
+
+        Returns None if no url can be popped now and block is False, if
+        timeout expires, or once the frontier is closed and empty.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_empty:
+            while True:
+                url = self._get()
+                if url is not None:
+                    return url
+                if not block or (self._closed and not len(self)):
+                    return None
+                wait = self._wait_time()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._not_empty.wait(wait)
+
+    def task_done(self, url=None):
+        """Marks the url returned by pop as crawled."""
+        if url is not None:
+            self.done.add(url)
+        with self._lock:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                self._all_done.notify_all()
+
+    def join(self):
+        """Blocks until every added url is marked as crawled."""
+        with self._all_done:
+            self._all_done.wait_for(lambda: self._unfinished <= 0)
+
+    def close(self):
+        """Wakes up blocked pops, they return None from now on if empty."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+
+    def snapshot(self):
+        """Returns JSON serializable state of the frontier. Urls popped but
+        not marked as crawled are pending like the queued ones."""
+        with self._lock:
+            queued = self._queued()
+            queued_set = set(queued)
+            in_progress = [url for url in self.seen
+                           if url not in self.done and url not in queued_set]
+            return {'pending': in_progress + queued, 'seen': list(self.seen)}
+
+    @classmethod
+    def restore(cls, snapshot, max_urls=None, **kwargs):
+        """Creates a frontier from a snapshot, kwargs are passed to the
+        constructor."""
+        frontier = cls(max_urls=max_urls, **kwargs)
+        frontier.seen = SeenSet(snapshot['seen'])
+        frontier.done = SeenSet(set(snapshot['seen']) - set(snapshot['pending']))
+        for url in snapshot['pending']:
+            frontier._put(url)
+        frontier._unfinished = len(snapshot['pending'])
+        return frontier
+
+    def __len__(self):
+        """Returns count of queued urls."""
+        return len(self._queue)
+
+    # Override these methods to change the order of urls, they are called
+    # with the lock held.
+
+    def _put(self, url):
+        self._queue.append(url)
+
+    def _get(self):
+        """Returns the next url to pop or None if there is no url to pop
+        now."""
+        return self._queue.popleft() if self._queue else None
+
+    def _queued(self):
+        """Returns a list of queued urls."""
+        return list(self._queue)
+
+    def _wait_time(self):
+        """Returns seconds after which _get may return a url without a new
+        one added, None if only after add."""
+        return None
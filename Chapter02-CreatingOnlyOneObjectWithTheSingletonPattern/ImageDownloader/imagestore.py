@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+INDEX_FILENAME = 'index.jsonl'
+
+
+class ImageStore():
+    """A directory of images named by SHA-256 of their content.
+
+    Images are streamed to disk in chunks of chunk_size bytes and hashed on
+    the way, so a body is never held in memory whole. Identical images from
+    different urls are stored in one file. An index of url to file name and
+    response validators is appended to index.jsonl in the directory. Urls
+    downloaded by earlier runs are requested only if modified since, and not
+    at all if revalidate is False or the server sent no validators.
+    """
+
+    def __init__(self, directory='images', chunk_size=64 * 1024,
+                 revalidate=True):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.index = {}
+        try:
+            with open(os.path.join(directory, INDEX_FILENAME), 'rb+') as file_:
+                end = 0
+                for line in file_:
+                    if not line.endswith(b'\n'):
+                        # The last line was cut by a crash, drop it, so the
+                        # next line is not appended to it.
+                        file_.truncate(end)
+                        break
+                    end += len(line)
+                    try:
+                        url, filename, validators = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.index[url] = (filename, validators)
+        except IOError:
+            pass
+
+    def get(self, url):
+        """Returns path of image downloaded from url or None."""
+        if url not in self.index:
+            return None
+        return os.path.join(self.directory, self.index[url][0])
+
+    def download(self, pool, url):
+        """Downloads image from url using ConnectionPool pool unless it was
+        downloaded before, returns its path."""
+        path = self.get(url)
+        headers = {}
+        if path:
+            validators = self.index[url][1]
+            if not self.revalidate or not validators:
+                return path
+            headers = validators
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            sha256 = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as file_, pool.open(
+                    url, headers) as response:
+                if response.status == 304:
+                    response.read()
+                    os.remove(tmp_path)
+                    return path
+                if response.status != 200:
+                    raise IOError("Got HTTP {} from {}".format(
+                        response.status, url))
+                while True:
+                    chunk = response.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    file_.write(chunk)
+
+            filename = sha256.hexdigest() + self._extension(url)
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                # The same image came from another url.
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        validators = {}
+        if response.headers.get('etag'):
+            validators['If-None-Match'] = response.headers['etag']
+        if response.headers.get('last-modified'):
+            validators['If-Modified-Since'] = response.headers['last-modified']
+        self._add_to_index(url, filename, validators)
+        return path
+
+    def _add_to_index(self, url, filename, validators):
+        """Appends url, later lines replace earlier ones on load."""
+        with self._lock:
+            self.index[url] = (filename, validators)
+            with open(os.path.join(self.directory, INDEX_FILENAME),
+                      'a') as file_:
+                file_.write(json.dumps([url, filename, validators]) + '\n')
+
+    @staticmethod
+    def _extension(url):
+        """Returns extension of url path, for example '.png'."""
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        return extension if 1 < len(extension) <= 5 else ''
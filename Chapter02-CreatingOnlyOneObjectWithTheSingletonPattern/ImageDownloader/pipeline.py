@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# Crawls a site and downloads its images in three overlapping stages:
+# fetching pages, parsing them and downloading images. Every stage runs in
+# its own pool of threads, so pages are fetched while earlier ones are still
+# parsed and their images downloaded.
+#
+# Parsed pages and found images are passed through bounded queues, so a slow
+# stage makes the previous one wait instead of piling up pages in memory.
+# Page urls form the only loop (parsing finds new pages), their frontier is
+# unbounded so the stages can never deadlock.
+#
+# Parsing is CPU bound, so threads parse one page at a time because of the
+# GIL. With --processes N, parser threads hand batches of up to --batch-size
+# fetched pages to a pool of N worker processes instead, and queue links and
+# images found there from this process, which alone owns the frontier.
+# Worker processes are spawned, not forked: the pool starts them on the
+# first batch, when stage threads are running already, and a forked worker
+# could inherit locks those threads hold.
+#
+# Requests to every host are limited to --rate per second, or one per
+# Crawl-delay seconds of its robots.txt, and urls disallowed there are
+# skipped. Pages of different hosts take turns in the frontier, so a host
+# waiting for its next request does not hold back the others.
+
+import argparse
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from checkpoint import Checkpoint
+from connectionpool import ConnectionPool
+from crawler import Singleton, to_site_url
+from extractor import extract_many, get_charset
+from frontier import SeenSet
+from imagestore import ImageStore
+from politeness import HostRateLimiter, PoliteFrontier, RobotsCache
+
+
+class CrawlPipeline():
+    """Crawls up to max_links pages of root site and downloads their images,
+    with configurable count of threads per stage and requests per host."""
+
+    def __init__(self, root, max_links=10, fetchers=4, parsers=2,
+                 downloaders=4, per_host=4, queue_size=16,
+                 images_dir='images', timeout=10,
+                 state_filename='crawl_state.json', processes=0,
+                 batch_size=8, rate=None, burst=1):
+        """processes is count of worker processes to parse pages in, 0
+        parses them in parser threads. rate is count of requests per second
+        to one host with bursts of up to burst requests, None means no limit
+        unless robots.txt sets Crawl-delay."""
+        self.parsed_root = urlparse(root)
+        self.max_links = max_links
+        self.fetchers = fetchers
+        self.downloaders = downloaders
+        self.batch_size = batch_size
+        self.process_pool = None
+        if processes:
+            # Workers are started on demand, after threads are running, so
+            # they are spawned rather than forked with locks other threads
+            # may hold. A parser thread per worker keeps every worker busy.
+            self.process_pool = ProcessPoolExecutor(
+                processes, multiprocessing.get_context('spawn'))
+            parsers = max(parsers, processes)
+        self.parsers = parsers
+        # per_host connections to a host are shared by all threads, which
+        # also limits count of concurrent requests to the host.
+        self.pool = ConnectionPool(per_host, timeout)
+        self.limiter = HostRateLimiter(rate, burst)
+        self.robots = RobotsCache(self.pool, self.limiter)
+
+        # (url, response headers, content) of fetched pages to parse, content
+        # is None for pages not modified since a previous crawl.
+        self.parsed_pages = queue.Queue(queue_size)
+        # Urls of images to download.
+        self.images = queue.Queue(queue_size)
+
+        self.singleton = Singleton()
+        # Crawl state, saved periodically to resume the crawl after a crash.
+        self.singleton.checkpoint = Checkpoint(state_filename)
+        unfinished = self.singleton.checkpoint.unfinished()
+        self.resumed = bool(unfinished)
+        if unfinished:
+            print("Resuming unfinished crawl")
+            self.singleton.frontier = PoliteFrontier.restore(
+                unfinished['frontier'], max_urls=max_links,
+                limiter=self.limiter)
+        else:
+            # Pages to fetch.
+            self.singleton.frontier = PoliteFrontier(
+                [root], max_urls=max_links, limiter=self.limiter)
+        self.singleton.checkpoint.track(frontier=self.singleton.frontier)
+        # Fetched web pages.
+        self.singleton.to_visit = SeenSet()
+        # Queued images.
+        self.singleton.downloaded = SeenSet()
+        self.frontier = self.singleton.frontier
+        self.singleton.images = ImageStore(images_dir)
+
+    def run(self):
+        """Crawls the site, returns when all images are downloaded."""
+        stages = [(self.fetch_pages, self.fetchers),
+                  (self.parse_pages, self.parsers),
+                  (self.download_images, self.downloaders)]
+        threads = []
+        for target, count in stages:
+            for number in range(count):
+                thread = threading.Thread(
+                    target=target,
+                    name='{}-{}'.format(target.__name__, number + 1))
+                thread.start()
+                threads.append(thread)
+        if self.resumed:
+            self.queue_missing_images()
+
+        # A page is done when it is parsed, which is after its links are
+        # added to the frontier. Then every stage is drained in order and
+        # stopped.
+        self.frontier.join()
+        self.frontier.close()
+        for stage_queue, count in ((self.parsed_pages, self.parsers),
+                                   (self.images, self.downloaders)):
+            stage_queue.join()
+            for _ in range(count):
+                stage_queue.put(None)
+
+        for thread in threads:
+            thread.join()
+        if self.process_pool:
+            self.process_pool.shutdown()
+        self.singleton.checkpoint.save(finished=True)
+
+    def fetch_pages(self):
+        while True:
+            url = self.frontier.pop(block=True)
+            if url is None:
+                return
+
+            if not self.robots.allowed(url):
+                print("Skipping {} disallowed by robots.txt".format(url))
+                self.page_done(url)
+                continue
+
+            try:
+                status, response = self.pool.request(
+                    url, self.singleton.checkpoint.conditional_headers(url))
+            except Exception:
+                self.page_done(url)
+                continue
+
+            if status.status == 304:
+                response = None
+            # Skip if not a web page.
+            elif 'text/html' not in status.get('content-type', ''):
+                self.page_done(url)
+                continue
+
+            self.singleton.to_visit.add(url)
+            print("Fetched {}".format(url))
+            self.parsed_pages.put((url, status, response))
+
+    def parse_pages(self):
+        while True:
+            batch = self.next_batch()
+            if not batch:
+                return
+
+            try:
+                self.parse_batch(batch)
+            finally:
+                for item in batch:
+                    self.parsed_pages.task_done()
+                    self.page_done(item[0])
+
+    def next_batch(self):
+        """Returns up to batch_size fetched pages, waiting only for the
+        first one. Returns an empty list when the stage is stopped."""
+        batch = []
+        item = self.parsed_pages.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch
+            try:
+                item = self.parsed_pages.get_nowait()
+            except queue.Empty:
+                return batch
+        if batch:
+            # Leave the stop signal to the next call.
+            self.parsed_pages.put(None)
+        return batch
+
+    def parse_batch(self, batch):
+        """Queues links and images of (url, status, response) pages."""
+        checkpoint = self.singleton.checkpoint
+        pages = [(response, get_charset(status['content-type']))
+                 for url, status, response in batch if response is not None]
+        if self.process_pool and pages:
+            found = iter(self.process_pool.submit(extract_many, pages).result())
+        else:
+            found = iter(extract_many(pages))
+
+        for url, status, response in batch:
+            if response is None:
+                links, images = checkpoint.cached_page(url)
+            else:
+                links, images = next(found)
+                checkpoint.remember_page(url, status, links, images)
+            self.queue_page(url, links, images)
+
+    def queue_page(self, url, links, images):
+        """Queues links and images found on the page."""
+        for link_url in links:
+            link_url = to_site_url(link_url, self.parsed_root)
+            if link_url:
+                self.frontier.add(link_url)
+
+        for src in images:
+            src = urljoin(url, src)
+            if self.singleton.downloaded.add(src):
+                self.images.put(src)
+
+    def queue_missing_images(self):
+        """Queues images of pages crawled before the crawl was interrupted
+        which are not downloaded. Queued images are not checkpointed, a page
+        is done once they are queued."""
+        store = self.singleton.images
+        for url in self.frontier.done:
+            page = self.singleton.checkpoint.pages.get(url)
+            if page is None:
+                continue
+            for src in page['images']:
+                src = urljoin(url, src)
+                if src not in store.index and \
+                        self.singleton.downloaded.add(src):
+                    self.images.put(src)
+
+    def page_done(self, url):
+        """Marks page as crawled after its links are in the frontier."""
+        self.frontier.task_done(url)
+        self.singleton.checkpoint.page_done()
+
+    def download_images(self):
+        while True:
+            src = self.images.get()
+            if src is None:
+                return
+
+            print("Downloading {}".format(src))
+            try:
+                if self.robots.allowed(src):
+                    self.limiter.acquire(src)
+                    self.singleton.images.download(self.pool, src)
+            except Exception as e:
+                print("Can not download {}: {}".format(src, e))
+            self.images.task_done()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('root', nargs='?', default='https://www.python.org')
+    arg_parser.add_argument('--max-links', type=int, default=10)
+    arg_parser.add_argument('--fetchers', type=int, default=4)
+    arg_parser.add_argument('--parsers', type=int, default=2)
+    arg_parser.add_argument('--downloaders', type=int, default=4)
+    arg_parser.add_argument('--per-host', type=int, default=4,
+                            help="connections to one host")
+    arg_parser.add_argument('--queue-size', type=int, default=16)
+    arg_parser.add_argument('--timeout', type=float, default=10,
+                            help="socket timeout in seconds")
+    arg_parser.add_argument('--processes', type=int, default=0,
+                            help="worker processes to parse pages in")
+    arg_parser.add_argument('--batch-size', type=int, default=8,
+                            help="pages sent to a worker process at once")
+    arg_parser.add_argument('--rate', type=float,
+                            help="requests per second to one host")
+    arg_parser.add_argument('--burst', type=int, default=1,
+                            help="requests to one host at once")
+    args = arg_parser.parse_args()
+
+    pipeline = CrawlPipeline(args.root, args.max_links, args.fetchers,
+                             args.parsers, args.downloaders, args.per_host,
+                             args.queue_size, timeout=args.timeout,
+                             processes=args.processes,
+                             batch_size=args.batch_size, rate=args.rate,
+                             burst=args.burst)
+    pipeline.run()
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from frontier import Frontier
+
+
+def host_of(url):
+    """Returns scheme://host:port part of url, the key of per host state."""
+    parts = urlsplit(url)
+    return parts.scheme + '://' + parts.netloc
+
+
+class TokenBucket():
+    """Allows rate requests per second on average and up to burst at once.
+
+    rate None means no limit. It is not thread-safe, HostRateLimiter locks
+    around it.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self):
+        """Returns seconds until a token is available, 0 if it is now."""
+        if self.rate is None:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Takes a token, call it when wait_time returns 0."""
+        if self.rate is not None:
+            self.tokens -= 1
+
+
+class HostRateLimiter():
+    """Keeps a token bucket per host, shared by all threads.
+
+    Every host gets rate requests per second with bursts of burst requests,
+    unless set_delay sets its own rate, for example from robots.txt.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_delay(self, host, delay):
+        """Allows one request to host per delay seconds."""
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.rate = 1.0 / delay
+            bucket.burst = 1
+            bucket.tokens = min(bucket.tokens, 1)
+
+    def wait_time(self, host):
+        """Returns seconds until a request to host is allowed."""
+        with self._lock:
+            return self._bucket(host).wait_time()
+
+    def try_acquire(self, host):
+        """Takes a token of host and returns True if one is available."""
+        with self._lock:
+            bucket = self._bucket(host)
+            if bucket.wait_time():
+                return False
+            bucket.take()
+            return True
+
+    def acquire(self, url):
+        """Blocks until a request to the host of url is allowed."""
+        host = host_of(url)
+        while not self.try_acquire(host):
+            time.sleep(self.wait_time(host))
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+
+class RobotsCache():
+    """Fetches robots.txt of every host once, tells which urls may be
+    crawled and passes Crawl-delay of the host to limiter."""
+
+    def __init__(self, pool, limiter, user_agent='*'):
+        self.pool = pool
+        self.limiter = limiter
+        self.user_agent = user_agent
+        self._robots = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def allowed(self, url):
+        """Returns True if robots.txt of the host allows to fetch url."""
+        return self.get(host_of(url)).can_fetch(self.user_agent, url)
+
+    def get(self, host):
+        """Returns RobotFileParser of host, fetches robots.txt if needed."""
+        robots = self._robots.get(host)
+        if robots is not None:
+            return robots
+
+        with self._lock:
+            host_lock = self._locks.setdefault(host, threading.Lock())
+        # Other threads wait for the first one to fetch robots.txt of host.
+        with host_lock:
+            robots = self._robots.get(host)
+            if robots is None:
+                robots = self._robots[host] = self._fetch(host)
+        return robots
+
+    def _fetch(self, host):
+        robots = RobotFileParser(host + '/robots.txt')
+        try:
+            status, body = self.pool.request(robots.url)
+        except Exception:
+            status = None
+        if status is not None and status.status == 200:
+            robots.parse(body.decode('utf-8', 'replace').splitlines())
+        else:
+            # Missing or unreachable robots.txt allows everything.
+            robots.allow_all = True
+
+        delay = robots.crawl_delay(self.user_agent)
+        if delay:
+            self.limiter.set_delay(host, float(delay))
+        return robots
+
+
+class PoliteFrontier(Frontier):
+    """A frontier which pops a url only when limiter allows a request to its
+    host.
+
+    Urls are queued per host and hosts take turns, so while one host waits
+    for its next token, urls of other hosts are popped. A pop takes time
+    proportional to the count of hosts with queued urls.
+    """
+
+    def __init__(self, urls=(), max_urls=None, limiter=None):
+        self.limiter = limiter or HostRateLimiter()
+        self._hosts = {}
+        # Hosts with queued urls in the order they take turns.
+        self._turns = deque()
+        super(PoliteFrontier, self).__init__(urls, max_urls)
+
+    def __len__(self):
+        return sum(len(urls) for urls in self._hosts.values())
+
+    def _put(self, url):
+        host = host_of(url)
+        urls = self._hosts.get(host)
+        if urls is None:
+            urls = self._hosts[host] = deque()
+            self._turns.append(host)
+        urls.append(url)
+
+    def _get(self):
+        for _ in range(len(self._turns)):
+            host = self._turns[0]
+            self._turns.rotate(-1)
+            if not self.limiter.try_acquire(host):
+                continue
+            urls = self._hosts[host]
+            url = urls.popleft()
+            if not urls:
+                del self._hosts[host]
+                self._turns.remove(host)
+            return url
+        return None
+
+    def _queued(self):
+        return [url for urls in self._hosts.values() for url in urls]
+
+    def _wait_time(self):
+        if not self._turns:
+            return None
+        return min(self.limiter.wait_time(host) for host in self._turns)
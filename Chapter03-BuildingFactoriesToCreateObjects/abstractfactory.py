@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import abc
 from urllib.error import URLError
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
+
+from listing import ftp_filenames, http_filenames
+from reader import shared_reader
 
 
 class AbstractFactory(metaclass=abc.ABCMeta):
@@ -90,28 +91,22 @@ class Parser(metaclass=abc.ABCMeta):
 
 class HTTPParser(Parser):
     def __call__(self, content):
-        filenames = []
-        soup = BeautifulSoup(content, 'html.parser')
-        links = soup.table.find('tbody').findAll('a')
-        for link in links:
-            filenames.append(link['href'])
-        return '\n'.join(filenames)
+        """Yields filenames from content, bytes or chunks of bytes."""
+        return http_filenames(content)
 
 
 class FTPParser(Parser):
     def __call__(self, content):
-        lines = content.decode('utf-8').split('\n')
-        filenames = []
-        for line in lines:
-            splitted_line = line.split(None, 8)
-            if len(splitted_line) == 9:
-                filenames.append(splitted_line[-1])
-        return '\n'.join(filenames)
+        """Yields filenames from content, bytes or chunks of bytes."""
+        return ftp_filenames(content)
 
 
 class Connector():
     """A client."""
 
+    # Reuses connections and recently read content of all connectors.
+    reader = shared_reader
+
     def __init__(self, factory):
         """factory is a AbstractFactory instance which creates all attributes of a connector according to factory class."""
         self.protocol = factory.create_protocol()
@@ -121,7 +116,13 @@ class Connector():
     def read(self, host, path):
         url = self.protocol + '://' + host + ':' + str(self.port) + path
         print("Connecting to {}".format(url))
-        return urlopen(url, timeout=2).read()
+        return self.reader.read(url)
+
+    def stream(self, host, path):
+        """Like read, but yields web content in chunks as they arrive."""
+        url = self.protocol + '://' + host + ':' + str(self.port) + path
+        print("Connecting to {}".format(url))
+        return self.reader.stream(url)
 
     @abc.abstractmethod
     def parse(self):
@@ -147,8 +148,8 @@ if __name__ == '__main__':
 
     connector = Connector(factory)
     try:
-        content = connector.read(domain, path)
+        # Filenames are printed while the listing is still downloading.
+        for filename in connector.parse(connector.stream(domain, path)):
+            print(filename)
     except URLError as e:
         print("Can not access resource with this method")
-    else:
-        print(connector.parse(content))
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 import abc
 from urllib.error import URLError
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
+
+from listing import ftp_filenames, http_filenames
+from reader import shared_reader
 
 
 class Connector(metaclass=abc.ABCMeta):
     """Abstract class to connect to remote resource."""
 
+    # Reuses connections and recently read content of all connectors.
+    reader = shared_reader
+
     def __init__(self, is_secure):
         self.is_secure = is_secure
         self.port = self.port_factory_method()
@@ -23,7 +27,13 @@ class Connector(metaclass=abc.ABCMeta):
         """A generic method for all subclasses, reads web content."""
         url = self.protocol + '://' + host + ':' + str(self.port) + path
         print("Connecting to {}".format(url))
-        return urlopen(url, timeout=2).read()
+        return self.reader.read(url)
+
+    def stream(self, host, path):
+        """Like read, but yields web content in chunks as they arrive."""
+        url = self.protocol + '://' + host + ':' + str(self.port) + path
+        print("Connecting to {}".format(url))
+        return self.reader.stream(url)
 
     @abc.abstractmethod
     def protocol_factory_method(self):
@@ -47,13 +57,9 @@ class HTTPConnector(Connector):
         return HTTPSecurePort() if self.is_secure else HTTPPort()
 
     def parse(self, content):
-        """Parses web content."""
-        filenames = []
-        soup = BeautifulSoup(content, 'html.parser')
-        links = soup.table.find('tbody').findAll('a')
-        for link in links:
-            filenames.append(link['href'])
-        return '\n'.join(filenames)
+        """Parses web content, bytes or chunks of bytes from stream, yields
+        filenames as they are found."""
+        return http_filenames(content)
 
 
 class FTPConnector(Connector):
@@ -66,14 +72,7 @@ class FTPConnector(Connector):
         return FTPPort()
 
     def parse(self, content):
-        lines = content.decode('utf-8').split('\n')
-        filenames = []
-        for line in lines:
-            # The FTP format typically has 8 columns, split them
-            splitted_line = line.split(None, 8)
-            if len(splitted_line) == 9:
-                filenames.append(splitted_line[-1])
-        return '\n'.join(filenames)
+        return ftp_filenames(content)
 
 
 class Port(metaclass=abc.ABCMeta):
@@ -121,8 +120,8 @@ if __name__ == '__main__':
         connector = FTPConnector(is_secure)
 
     try:
-        content = connector.read(domain, path)
+        # Filenames are printed while the listing is still downloading.
+        for filename in connector.parse(connector.stream(domain, path)):
+            print(filename)
     except URLError as e:
         print("Can not access resource with this method")
-    else:
-        print(connector.parse(content))
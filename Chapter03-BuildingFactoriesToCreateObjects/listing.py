@@ -0,0 +1,85 @@
+import codecs
+from html.parser import HTMLParser
+
+
+class TableLinkParser(HTMLParser):
+    """Collects href of links in the body of the first table on a page.
+
+    Links are collected as soon as their tags are fed, take them with
+    pop_links. No tree is built, so memory does not grow with the page.
+    """
+
+    def __init__(self):
+        super(TableLinkParser, self).__init__(convert_charrefs=True)
+        self.links = []
+        self._tables = 0
+        self._bodies = 0
+        self._done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+        if tag == 'table':
+            self._tables += 1
+        elif tag == 'tbody' and self._tables:
+            self._bodies += 1
+        elif tag == 'a' and self._bodies:
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        if self._done:
+            return
+        if tag == 'tbody' and self._bodies:
+            self._bodies -= 1
+            self._done = not self._bodies
+        elif tag == 'table' and self._tables:
+            self._tables -= 1
+            self._done = not self._tables
+
+    def pop_links(self):
+        """Returns links collected since the previous call."""
+        links, self.links = self.links, []
+        return links
+
+
+def as_chunks(content):
+    """Returns content, bytes or an iterable of bytes chunks, as chunks."""
+    if isinstance(content, bytes):
+        return [content]
+    return content
+
+
+def http_filenames(content, encoding='utf-8'):
+    """Yields names of files linked from a HTTP directory listing page,
+    parsing each chunk of content as it arrives."""
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    parser = TableLinkParser()
+    for chunk in as_chunks(content):
+        parser.feed(decoder.decode(chunk))
+        yield from parser.pop_links()
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from parser.pop_links()
+
+
+def ftp_filenames(content, encoding='utf-8'):
+    """Yields names of files in a FTP directory listing, line by line as
+    chunks of content arrive."""
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    rest = ''
+    for chunk in as_chunks(content):
+        lines = (rest + decoder.decode(chunk)).split('\n')
+        # The last line may continue in the next chunk.
+        rest = lines.pop()
+        yield from _ftp_names(lines)
+    yield from _ftp_names([rest + decoder.decode(b'', final=True)])
+
+
+def _ftp_names(lines):
+    for line in lines:
+        # The FTP format typically has 8 columns, split them
+        splitted_line = line.split(None, 8)
+        if len(splitted_line) == 9:
+            yield splitted_line[-1]
@@ -0,0 +1,248 @@
+import http.client
+import threading
+import time
+from collections import OrderedDict
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import CacheFTPHandler, build_opener
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class ResponseCache():
+    """Keeps bodies of up to max_entries responses by url, each for ttl
+    seconds. The least recently used entry is evicted when it is full.
+
+    hits, misses and evictions count lookups and evicted entries, expired
+    entries count as misses.
+    """
+
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns cached body of url or None."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[url]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, url, body):
+        with self._lock:
+            self._entries[url] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(url)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns a dict of hits, misses, evictions and size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'size': len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PooledResponse():
+    """A streamed HTTP response which gives its connection back to the pool
+    when closed."""
+
+    def __init__(self, pool, key, connection, response):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+
+    def read(self, amount=None):
+        try:
+            return self.response.read(amount)
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise URLError(e)
+
+    def close(self):
+        if self.connection is None:
+            return
+        # A connection can be reused only if the whole body was read.
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.key, self.connection)
+        else:
+            self.response.close()
+            self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConnectionPool():
+    """Keeps up to max_idle idle keep-alive connections per (protocol, host,
+    port), so repeated reads from a server reuse one connection.
+
+    HTTP and HTTPS connections are kept by the pool. FTP connections are
+    kept by urllib's CacheFTPHandler, which logs in once per server.
+    """
+
+    def __init__(self, max_idle=2, timeout=2, max_redirects=5):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ftp_opener = build_opener(CacheFTPHandler)
+
+    def read(self, url):
+        """Returns body of url, raises URLError like urlopen."""
+        with self.open(url) as response:
+            return response.read()
+
+    def open(self, url):
+        """Sends GET request to url following redirects, returns a file-like
+        response to read the body from. Close it to give the connection
+        back, for example with a with statement."""
+        if urlsplit(url).scheme == 'ftp':
+            return self._ftp_opener.open(url, timeout=self.timeout)
+
+        for _ in range(self.max_redirects + 1):
+            response = self._open(url)
+            status = response.status
+            location = response.headers.get('location')
+            if (status in REDIRECT_STATUSES and location) or status >= 400:
+                # Read the rest of the body, so the connection is reusable.
+                with response:
+                    response.read()
+                if status >= 400:
+                    raise HTTPError(url, status, response.reason,
+                                    response.headers, None)
+                url = urljoin(url, location)
+                continue
+            return response
+        raise URLError("Too many redirects: " + url)
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _open(self, url):
+        """Returns PooledResponse of GET request to url."""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                response = self._request(connection, path)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection, retry
+                # once with a fresh one.
+                connection.close()
+                connection = self._connect(key)
+                response = self._request(connection, path)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            raise URLError(e)
+        return PooledResponse(self, key, connection, response)
+
+    @staticmethod
+    def _request(connection, path):
+        connection.request('GET', path)
+        return connection.getresponse()
+
+    def _acquire(self, key):
+        """Returns (connection, reused) to the key server."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def release(self, key, connection):
+        """Keeps connection to the key server idle for reuse."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _connect(self, key):
+        protocol, host, port = key
+        if protocol == 'https':
+            return http.client.HTTPSConnection(host, port,
+                                               timeout=self.timeout)
+        if protocol == 'http':
+            return http.client.HTTPConnection(host, port,
+                                              timeout=self.timeout)
+        raise URLError("Unsupported protocol: {}".format(protocol))
+
+
+class Reader():
+    """Reads urls through a ConnectionPool, answering from a ResponseCache
+    when cache is given."""
+
+    def __init__(self, pool=None, cache=None):
+        self.pool = pool or ConnectionPool()
+        self.cache = cache
+
+    def read(self, url):
+        """Returns body of url, raises URLError if it can not be read."""
+        if self.cache is not None:
+            body = self.cache.get(url)
+            if body is not None:
+                return body
+
+        body = self.pool.read(url)
+        if self.cache is not None:
+            self.cache.put(url, body)
+        return body
+
+    def stream(self, url, chunk_size=64 * 1024):
+        """Yields body of url in chunks of up to chunk_size bytes as they
+        arrive. A cached body is yielded whole, a streamed one is not
+        cached, as it is never in memory whole."""
+        if self.cache is not None:
+            body = self.cache.get(url)
+            if body is not None:
+                yield body
+                return
+
+        with self.pool.open(url) as response:
+            yield from iter(lambda: response.read(chunk_size), b'')
+
+
+# Shared by all connectors, so they reuse connections and cached listings.
+shared_reader = Reader(cache=ResponseCache())
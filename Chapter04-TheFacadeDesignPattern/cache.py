@@ -1,24 +1,201 @@
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
+import fcntl
+import mmap
+import os
 import pickle
+import struct
+import tempfile
+import threading
+
+# Counts of saves and of compactions of a cache, in a file mapped to memory.
+GENERATION = struct.Struct('QQ')
 
 
 class Cache():
-    def __init__(self, filename):
+    """Keeps up to max_entries objects by key in a log file.
+
+    Every entry expires ttl after it is saved, unless save gets its own ttl,
+    and is kept for load_stale keep_stale longer. Entries are kept from the
+    least to the most recently used one, and the least recently used entry
+    is evicted when the cache is full.
+
+    The file is read once, then entries are kept in memory too, so a hit is
+    a dict lookup. save appends a pickled (key, entry) record to the file,
+    save_many appends records of many entries in one write, so a save takes
+    time independent of count of entries. Once most records are replaced or
+    evicted, the file is compacted: live entries are written to a temporary
+    file which is renamed over the log, so the log is never partially
+    rewritten.
+
+    Counters of saves and of compactions in the filename + '.gen' file, which
+    every process using the cache maps to memory, are incremented on every
+    save and compaction. Saves of all processes are serialized with a lock
+    on that file, and every save first reads records appended by others
+    since its last read, or the whole file if another process compacted it,
+    so saves of other processes are never lost. With shared=True, every load
+    checks the counters too, so processes see saves of each other. Without
+    it, a load sees saves of other processes only once this process saved.
+    """
+
+    def __init__(self, filename, max_entries=100000, ttl=timedelta(hours=3),
+                 shared=False, keep_stale=timedelta(0)):
         self.filename = filename
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.keep_stale = keep_stale
+        self._entries = None
+        self._generation = None
+        self._end = 0
+        self._records = 0
+        self._lock = threading.Lock()
+        self.shared = shared
+        self._generation_fd = os.open(filename + '.gen',
+                                  os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._generation_fd).st_size < GENERATION.size:
+            os.ftruncate(self._generation_fd, GENERATION.size)
+        self._generation_map = mmap.mmap(self._generation_fd, GENERATION.size)
+
+    def save(self, obj, key=None, ttl=None):
+        self.save_many([(key, obj)], ttl)
+
+    def save_many(self, items, ttl=None):
+        """Saves (key, obj) items with one write."""
+        expired = datetime.utcnow() + (ttl or self.ttl)
+        records = []
+        with self._lock, self._save_lock():
+            entries = self._current(locked=True)
+            for key, obj in items:
+                entry = {'obj': obj, 'expired': expired}
+                entries[key] = entry
+                entries.move_to_end(key)
+                records.append(pickle.dumps((key, entry)))
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+            self._records += len(records)
+            if self._records > 2 * max(len(entries), 1000):
+                self._compact(entries)
+            else:
+                self._append(b''.join(records))
+
+    def load(self, key=None):
+        obj, fresh = self.load_stale(key)
+        return obj if fresh else None
 
-    def save(self, obj):
-        with open(self.filename, 'wb') as file_:
-            dct = {
-                'obj': obj,
-                'expired': datetime.utcnow() + timedelta(hours=3)
-            }
-            pickle.dump(dct, file_)
+    def load_stale(self, key=None):
+        """Returns (obj, fresh), where fresh is False if obj expired, or
+        (None, False) if there is no entry."""
+        with self._lock:
+            entries = self._current()
+            entry = entries.get(key)
+            if entry is None:
+                return None, False
+            now = datetime.utcnow()
+            if entry['expired'] <= now - self.keep_stale:
+                del entries[key]
+                return None, False
+            # The order is saved to the file by the next compaction.
+            entries.move_to_end(key)
+            return entry['obj'], entry['expired'] > now
 
-    def load(self):
+    def close(self):
+        """Unmaps the generation counter."""
+        if self._generation_map is not None:
+            self._generation_map.close()
+            os.close(self._generation_fd)
+            self._generation_map = None
+
+    def _current(self, locked=False):
+        """Returns entries in memory, reads them from the file first time or
+        records saved by another process since the last read, the latter
+        only if shared or locked. Pass locked=True if saves of other
+        processes are locked already."""
+        if self._entries is not None and not (self.shared or locked):
+            return self._entries
+        generation = GENERATION.unpack_from(self._generation_map)
+        if self._entries is not None and generation == self._generation:
+            return self._entries
+
+        # A shared lock keeps other processes from compacting while reading.
+        with self._save_lock(fcntl.LOCK_SH) if not locked else nullcontext():
+            generation = GENERATION.unpack_from(self._generation_map)
+            if self._entries is None or generation[1] != self._generation[1]:
+                self._entries = OrderedDict()
+                self._end = 0
+                self._records = 0
+            self._read()
+            self._generation = generation
+        return self._entries
+
+    def _bump_generation(self, compacted=False):
+        saves, compactions = self._generation
+        self._generation = (saves + 1, compactions + compacted)
+        GENERATION.pack_into(self._generation_map, 0, *self._generation)
+
+    @contextmanager
+    def _save_lock(self, operation=fcntl.LOCK_EX):
+        """Locks saves of all processes using the cache."""
+        fcntl.flock(self._generation_fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._generation_fd, fcntl.LOCK_UN)
+
+    def _read(self):
+        """Adds records written after self._end to entries."""
+        dropped = datetime.utcnow() - self.keep_stale
         try:
             with open(self.filename, 'rb') as file_:
-                result = pickle.load(file_)
-                if result['expired'] > datetime.utcnow():
-                    return result['obj']
+                file_.seek(self._end)
+                while True:
+                    try:
+                        record = pickle.load(file_)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        # A record cut by a crash is overwritten by the next
+                        # save.
+                        break
+                    self._end = file_.tell()
+                    self._records += 1
+                    if isinstance(record, dict):
+                        # A file of the cache which kept one entry without a
+                        # key.
+                        record = (None, record)
+                    key, entry = record
+                    if entry['expired'] <= dropped:
+                        continue
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
         except IOError:
-            pass
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _append(self, data):
+        with open(self.filename, 'ab') as file_:
+            # Saves are locked and records of others are read, so anything
+            # after self._end is a record cut by a crash.
+            if file_.tell() > self._end:
+                file_.truncate(self._end)
+            file_.write(data)
+        self._end += len(data)
+        self._bump_generation()
+
+    def _compact(self, entries):
+        """Replaces the file by records of entries only."""
+        fd, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.filename)),
+            prefix=os.path.basename(self.filename), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file_:
+                for key, entry in entries.items():
+                    pickle.dump((key, entry), file_)
+                end = file_.tell()
+            os.replace(tmp_filename, self.filename)
+        except Exception:
+            os.remove(tmp_filename)
+            raise
+        self._end = end
+        self._records = len(entries)
+        self._bump_generation(compacted=True)
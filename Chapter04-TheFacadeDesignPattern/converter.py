@@ -1,4 +1,11 @@
+from array import array
+
+
 class Converter():
     @staticmethod
     def from_kelvin_to_celcius(kelvin):
+        """Converts a number or a column of numbers, a NumPy array converts
+        at once."""
+        if isinstance(kelvin, array):
+            return array('d', [value - 273.15 for value in kelvin])
         return kelvin - 273.15
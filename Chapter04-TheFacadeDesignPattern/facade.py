@@ -1,4 +1,8 @@
 #!/usr/bin/env python3
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import timedelta
+import threading
+
 from cache import Cache
 from weatherprovider import WeatherProvider
 from parser import Parser
@@ -7,26 +11,131 @@ from converter import Converter
 
 
 class Facade():
-    def get_forcast(self, city, country):
-        cache = Cache('weather_cache')
+    def __init__(self, cache=None, fetchers=8):
+        # Forecasts of many cities, each fresh for 3 hours, then served for
+        # up to a day more while it is being refreshed.
+        self.cache = cache or Cache('weather_cache',
+                                    keep_stale=timedelta(days=1))
+        # Threads fetching forecasts of many cities at once and refreshing
+        # expired ones in the background, at most fetchers requests at once.
+        self.fetcher = ThreadPoolExecutor(fetchers)
+        # Made on the first fetch, so cached forecasts are served without the
+        # API key in config.ini.
+        self._weather_provider = None
+        # Futures of forecasts being fetched by their keys, so every city is
+        # fetched once at a time however many callers ask for it.
+        self._fetches = {}
+        self._lock = threading.Lock()
 
-        cache_result = cache.load()
+    @property
+    def weather_provider(self):
+        with self._lock:
+            if self._weather_provider is None:
+                self._weather_provider = WeatherProvider()
+            return self._weather_provider
 
-        if cache_result:
+    def get_forcast(self, city, country):
+        key = (city.lower(), country.lower())
+        cache_result, fresh = self.cache.load_stale(key)
+
+        if cache_result is not None:
+            if not fresh:
+                # Serve the expired forecast without waiting for a new one.
+                self._fetch(key, city, country, background=True)
             return cache_result
         else:
-            weather_provider = WeatherProvider()
-            weather_data = weather_provider.get_weather_data(city, country)
+            return self._fetch(key, city, country).result()
+
+    def get_forecasts(self, locations):
+        """Returns a list of forecasts of (city, country) locations. Cached
+        forecasts are looked up first, then the others are fetched all at
+        once, so it takes about as long as the slowest fetch. Fetched
+        forecasts are saved to the cache at once."""
+        results = []
+        expired = []
+        batch = {}
+        for city, country in locations:
+            key = (city.lower(), country.lower())
+            cache_result, fresh = self.cache.load_stale(key)
+            if cache_result is None:
+                results.append(self._fetch(key, city, country,
+                                           background=True, batch=batch))
+            else:
+                results.append(cache_result)
+                if not fresh:
+                    expired.append((key, city, country))
+        # Refresh expired forecasts after the missing ones are queued.
+        for key, city, country in expired:
+            self._fetch(key, city, country, background=True)
+        try:
+            return [result.result() if isinstance(result, Future) else result
+                    for result in results]
+        finally:
+            self._save_batch(batch)
+
+    def _fetch(self, key, city, country, background=False, batch=None):
+        """Returns Future of the forecast, fetches it unless another caller
+        does already. The fetch runs in the calling thread or, if background
+        is True, in a fetcher thread. If batch is a dict, a started fetch is
+        added to it by key and its forecast is saved by _save_batch."""
+        with self._lock:
+            future = self._fetches.get(key)
+            if future is not None:
+                return future
+            future = self._fetches[key] = Future()
+        if batch is not None:
+            batch[key] = future
+
+        save = batch is None
+        if background:
+            self.fetcher.submit(self._refresh, key, city, country, future,
+                                save)
+        else:
+            self._refresh(key, city, country, future, save)
+        return future
+
+    def _refresh(self, key, city, country, future, save=True):
+        try:
+            temperature_celcius = self._download(city, country)
+            if save:
+                self.cache.save(temperature_celcius, key)
+        except Exception as e:
+            # A failed background refresh is retried by the next caller
+            # getting the expired forecast.
+            with self._lock:
+                del self._fetches[key]
+            future.set_exception(e)
+            return
+        if save:
+            with self._lock:
+                del self._fetches[key]
+        # Otherwise the fetch stays registered until _save_batch saved it, so
+        # the city is not fetched again meanwhile.
+        future.set_result(temperature_celcius)
+
+    def _save_batch(self, batch):
+        """Saves forecasts fetched for batch with one cache write."""
+        if not batch:
+            return
+        wait(batch.values())
+        try:
+            self.cache.save_many([(key, future.result())
+                                  for key, future in batch.items()
+                                  if future.exception() is None])
+        finally:
+            with self._lock:
+                for key, future in batch.items():
+                    if future.exception() is None:
+                        del self._fetches[key]
 
-            parser = Parser()
-            parsed_data = parser.parse_weather_data(weather_data)
+    def _download(self, city, country):
+        weather_data = self.weather_provider.get_weather_data(city, country)
 
-            weather = Weather(parsed_data)
-            temperature_celcius = Converter.from_kelvin_to_celcius(
-                weather.temperature)
+        parser = Parser()
+        parsed_data = parser.parse_weather_data(weather_data)
 
-            cache.save(temperature_celcius)
-            return temperature_celcius
+        weather = Weather(parsed_data)
+        return Converter.from_kelvin_to_celcius(weather.temperature)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,61 @@
-from datetime import datetime
+from array import array
 import json
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SECONDS_PER_DAY = 24 * 60 * 60
 
 
 class Parser():
     def parse_weather_data(self, weather_data):
-        parsed = json.loads(weather_data)
-        start_date = None
-        result = []
-
-        for data in parsed['list']:
-            date = datetime.fromtimestamp(data['dt'])
-            start_date = start_date or date
-            if start_date.day != date.day:
-                return result
-            result.append(data['temp']['day'])
+        """Returns list of day temperatures of the first day of the
+        forecast."""
+        days, temperatures = self.parse_weather_columns(weather_data)
+        if not len(days):
+            return []
+        if numpy is not None:
+            other_days = numpy.flatnonzero(days != days[0])
+            count = other_days[0] if len(other_days) else len(days)
+        else:
+            count = 0
+            while count < len(days) and days[count] == days[0]:
+                count += 1
+        return temperatures[:count].tolist()
+
+    def parse_weather_columns(self, weather_data):
+        """Returns (days, temperatures) columns of all entries of a forecast,
+        where days are local dates as days since the epoch. Columns are NumPy
+        arrays if NumPy is installed, otherwise array.array."""
+        parsed = json.loads(weather_data)['list']
+        timestamps = [data['dt'] for data in parsed]
+        temperatures = [data['temp']['day'] for data in parsed]
+
+        # Local time is UTC plus an offset, which changes only if the
+        # forecast spans a daylight saving time change.
+        first_offset = time.localtime(timestamps[0]).tm_gmtoff \
+            if timestamps else 0
+        if not timestamps or \
+                time.localtime(timestamps[-1]).tm_gmtoff == first_offset:
+            offsets = None
+        else:
+            offsets = [time.localtime(timestamp).tm_gmtoff
+                       for timestamp in timestamps]
+
+        if numpy is not None:
+            days = numpy.array(timestamps, dtype=numpy.int64)
+            days += first_offset if offsets is None else numpy.array(offsets)
+            days //= SECONDS_PER_DAY
+            return days, numpy.array(temperatures, dtype=numpy.float64)
+
+        if offsets is None:
+            days = array('q', [(timestamp + first_offset) // SECONDS_PER_DAY
+                               for timestamp in timestamps])
+        else:
+            days = array('q', [(timestamp + offset) // SECONDS_PER_DAY
+                               for timestamp, offset in zip(timestamps,
+                                                            offsets)])
+        return days, array('d', temperatures)
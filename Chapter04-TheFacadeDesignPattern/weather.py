@@ -1,8 +1,55 @@
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
 class Weather():
     def __init__(self, data):
-        result = 0
+        if numpy is not None and isinstance(data, numpy.ndarray):
+            self.temperature = float(data.mean())
+        else:
+            self.temperature = sum(data) / len(data)
 
-        for r in data:
-            result += r
+    @staticmethod
+    def daily(days, temperatures):
+        """Returns (days, means, minimums, maximums) columns of temperatures
+        per day, from columns of Parser.parse_weather_columns."""
+        if numpy is not None:
+            days = numpy.asarray(days)
+            temperatures = numpy.asarray(temperatures, dtype=numpy.float64)
+            if not len(days):
+                empty = numpy.array([], dtype=numpy.float64)
+                return (numpy.array([], dtype=numpy.int64), empty,
+                        empty.copy(), empty.copy())
+            order = numpy.argsort(days, kind='stable')
+            days = days[order]
+            temperatures = temperatures[order]
+            # Indexes where every day starts in the sorted columns.
+            starts = numpy.flatnonzero(numpy.diff(days, prepend=days[0] - 1))
+            counts = numpy.diff(numpy.append(starts, len(days)))
+            return (days[starts],
+                    numpy.add.reduceat(temperatures, starts) / counts,
+                    numpy.minimum.reduceat(temperatures, starts),
+                    numpy.maximum.reduceat(temperatures, starts))
 
-        self.temperature = result / len(data)
+        totals = {}
+        for day, temperature in zip(days, temperatures):
+            total = totals.get(day)
+            if total is None:
+                totals[day] = [temperature, 1, temperature, temperature]
+            else:
+                total[0] += temperature
+                total[1] += 1
+                if temperature < total[2]:
+                    total[2] = temperature
+                elif temperature > total[3]:
+                    total[3] = temperature
+        unique_days = sorted(totals)
+        return (array('q', unique_days),
+                array('d', [totals[day][0] / totals[day][1]
+                            for day in unique_days]),
+                array('d', [totals[day][2] for day in unique_days]),
+                array('d', [totals[day][3] for day in unique_days]))
@@ -1,5 +1,7 @@
+import http.client
+import threading
+import urllib.error
 import urllib.parse
-import urllib.request
 import configparser
 
 
@@ -8,9 +10,42 @@ class WeatherProvider():
         config = configparser.ConfigParser()
         config.read('config.ini')
         self.api_key = config['DEFAULT']['APPID']
-        self.api_url = 'http://api.openweathermap.org/data/2.5/forecast/daily?q={},{}&APPID={}'
+        self.api_host = 'api.openweathermap.org'
+        self.api_path = '/data/2.5/forecast/daily?q={},{}&APPID={}'
+        # Every thread keeps its own keep-alive connection to the API.
+        self._local = threading.local()
 
     def get_weather_data(self, city, country):
         city = urllib.parse.quote(city)
-        url = self.api_url.format(city, country, self.api_key)
-        return urllib.request.urlopen(url).read().decode('utf-8')
+        path = self.api_path.format(city, country, self.api_key)
+        try:
+            response, body = self._get(path)
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # The server closed the idle connection, retry with a new one.
+            self._local.connection = None
+            response, body = self._get(path)
+
+        if response.status != 200:
+            raise urllib.error.HTTPError(
+                'http://' + self.api_host + path, response.status,
+                response.reason, response.msg, None)
+        return body.decode('utf-8')
+
+    def _get(self, path):
+        """Returns (response, body) of GET request to path, sent on the
+        connection of the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(
+                self.api_host, timeout=10)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            self._local.connection = None
+            raise
+        if response.will_close:
+            connection.close()
+        return response, body